@@ -0,0 +1,34 @@
+# counter/management/commands/_frames.py
+import os
+import cv2
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+def sample_frames(source, limit=50):
+    """
+    Read up to ``limit`` BGR frames from a video file, stream URL or a
+    directory of images, spread evenly over videos of known length.
+    """
+    if os.path.isdir(source):
+        names = sorted(n for n in os.listdir(source) if n.lower().endswith(IMAGE_EXTENSIONS))
+        frames = (cv2.imread(os.path.join(source, name)) for name in names)
+        return [frame for frame in frames if frame is not None][:limit]
+
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open {source}")
+    try:
+        length = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        step = max(1, length // limit) if length > 0 else 1
+        frames = []
+        index = 0
+        while len(frames) < limit:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if index % step == 0:
+                frames.append(frame)
+            index += 1
+        return frames
+    finally:
+        cap.release()
@@ -0,0 +1,109 @@
+# counter/management/commands/benchmark_detector.py
+import time
+import numpy as np
+import torch
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from counter.utils.detectors import TorchDetector, PERSON_CLASS_ID, configure_torch_threads, cpu_threads
+from ._frames import sample_frames
+
+def legacy_detect(detector, frames):
+    """
+    The inference call as it was before the CPU profile: autocast on every
+    device, no inference mode, NMS over all classes. Kept here only as the
+    baseline.
+    """
+    with torch.cuda.amp.autocast():
+        results = detector.model(list(frames), verbose=False)
+    return legacy_postprocess(results)
+
+def legacy_postprocess(results):
+    """Row-by-row conversion of the boxes with a Python class filter."""
+    batch = []
+    for result in results:
+        detections = []
+        for r in result.boxes.data:
+            x1, y1, x2, y2, conf, cls = r
+            if int(cls) == PERSON_CLASS_ID:
+                detections.append([x1, y1, x2, y2, conf])
+        batch.append(detections)
+    return batch
+
+class Command(BaseCommand):
+    help = "Benchmark the PyTorch detector: legacy call vs. the CPU inference profile and its options."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=None,
+                            help="Video or image directory to take frames from; blank 720p frames by default.")
+        parser.add_argument('--weights', default=getattr(settings, 'COUNTER_DETECTOR_WEIGHTS', 'yolov8n.pt'))
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'COUNTER_BATCH_SIZE', 8))
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--threads', type=int, default=0,
+                            help="Intra-op threads; defaults to the COUNTER_CPU_THREADS layout.")
+        parser.add_argument('--compile', default='default',
+                            help="torch.compile mode for the compiled run, or 'off' to skip it.")
+
+    def handle(self, *args, **options):
+        if options['source']:
+            frames = sample_frames(options['source'], options['batch_size'])
+            if not frames:
+                raise CommandError(f"No frames read from {options['source']}")
+        else:
+            frames = [np.zeros((720, 1280, 3), dtype=np.uint8)]
+        batch = (frames * options['batch_size'])[:options['batch_size']]
+
+        threads = options['threads'] or cpu_threads()
+        configure_torch_threads(threads, getattr(settings, 'COUNTER_INTEROP_THREADS', 1))
+        self.stdout.write(f"batch {len(batch)} x {batch[0].shape[1]}x{batch[0].shape[0]}, "
+                          f"{threads} intra-op threads, {torch.get_num_interop_threads()} inter-op")
+
+        runs = [
+            ('legacy', {}, legacy_detect),
+            ('cpu profile', {}, None),
+            ('channels_last', {'channels_last': True}, None),
+        ]
+        if options['compile'] != 'off':
+            runs.append((f"compile={options['compile']}", {'compile': options['compile']}, None))
+
+        self.stdout.write(f"{'run':<24} {'first ms':>10} {'median ms':>10} {'p90 ms':>10} {'fps':>8}")
+        for name, detector_options, call in runs:
+            try:
+                detector = TorchDetector(options['weights'], **detector_options)
+                detect = (lambda frames: call(detector, frames)) if call else detector.detect_batch
+                start = time.perf_counter()
+                detect(batch)
+                first = time.perf_counter() - start
+                timings = []
+                for _ in range(options['iterations']):
+                    start = time.perf_counter()
+                    detect(batch)
+                    timings.append(time.perf_counter() - start)
+            except Exception as e:
+                self.stdout.write(f"{name:<24} failed: {e}")
+                continue
+            median = float(np.median(timings))
+            self.stdout.write(
+                f"{name:<24} {first * 1000:>10.1f} {median * 1000:>10.1f} "
+                f"{np.percentile(timings, 90) * 1000:>10.1f} {len(batch) / median:>8.1f}"
+            )
+
+        self.benchmark_postprocess(options['weights'], batch, options['iterations'])
+
+    def benchmark_postprocess(self, weights, batch, iterations):
+        """Python time spent turning the predictor's results into detections."""
+        detector = TorchDetector(weights)
+        with torch.inference_mode():
+            legacy_results = detector.model(list(batch), verbose=False)
+            results = detector.model(list(batch), **detector.predict_args)
+
+        self.stdout.write(f"{'post-processing':<24} {'boxes/frame':>12} {'us/frame':>10}")
+        for name, convert, converted in [
+            ('legacy loop', legacy_postprocess, legacy_results),
+            ('vectorized', TorchDetector.to_arrays, results),
+        ]:
+            start = time.perf_counter()
+            for _ in range(iterations):
+                convert(converted)
+            elapsed = (time.perf_counter() - start) / iterations / len(batch)
+            boxes = sum(len(result.boxes) for result in converted) / len(batch)
+            self.stdout.write(f"{name:<24} {boxes:>12.1f} {elapsed * 1e6:>10.1f}")
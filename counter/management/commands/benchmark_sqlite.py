@@ -0,0 +1,147 @@
+# counter/management/commands/benchmark_sqlite.py
+import copy
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+from django.db.models import Avg, Max
+from counter.models import Branch, Camera, PersonCount
+from .load_test_streams import percentile, ms
+
+ALIAS = 'benchmark'
+
+class Command(BaseCommand):
+    help = ("Benchmark SQLite under concurrent count writers and dashboard readers, with "
+            "Django's default connection settings and with the configured ones. Runs on a "
+            "scratch database, never the real one.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=['default', 'configured', 'both'], default='both')
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=10.0)
+        parser.add_argument('--batch', type=int, default=20,
+                            help="Rows inserted per write transaction.")
+        parser.add_argument('--write-pause', type=float, default=0.05,
+                            help="Seconds each writer waits between transactions.")
+        parser.add_argument('--cameras', type=int, default=16)
+        parser.add_argument('--seed-rows', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        default = connections['default'].settings_dict
+        if default['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError("The default database is not SQLite")
+        if not default.get('OPTIONS'):
+            self.stdout.write("note: no SQLite OPTIONS configured (COUNTER_SQLITE_TUNED=false?)")
+
+        modes = {
+            'default': ({}, 0),
+            'configured': (default.get('OPTIONS', {}), default.get('CONN_MAX_AGE', 0)),
+        }
+        names = list(modes) if options['mode'] == 'both' else [options['mode']]
+        self.options = options
+        self.stdout.write(f"{options['writers']} writers x {options['batch']} rows, {options['readers']} readers, "
+                          f"{options['cameras']} cameras, {options['seed_rows']} seed rows, {options['duration']:.0f} s")
+        self.stdout.write(f"{'mode':<12} {'op':<6} {'ops/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'errors':>7}")
+        for name in names:
+            self.run_mode(name, *modes[name])
+
+    def run_mode(self, name, db_options, conn_max_age):
+        directory = tempfile.mkdtemp(prefix='benchmark_sqlite_')
+        settings_dict = copy.deepcopy(connections['default'].settings_dict)
+        settings_dict.update(NAME=os.path.join(directory, 'db.sqlite3'), OPTIONS=copy.deepcopy(db_options),
+                             CONN_MAX_AGE=conn_max_age)
+        connections.settings[ALIAS] = settings_dict
+        try:
+            cameras = self.seed()
+            stop = threading.Event()
+            results = {'write': ([], []), 'read': ([], [])}
+            threads = [
+                threading.Thread(target=self.worker, args=(self.write, self.options['write_pause'], cameras, stop,
+                                                           *results['write']))
+                for _ in range(self.options['writers'])
+            ] + [
+                threading.Thread(target=self.worker, args=(self.read, 0, cameras, stop, *results['read']))
+                for _ in range(self.options['readers'])
+            ]
+            for thread in threads:
+                thread.start()
+            time.sleep(self.options['duration'])
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+            for op, (latencies, errors) in results.items():
+                self.stdout.write(
+                    f"{name:<12} {op:<6} {len(latencies) / self.options['duration']:>8.1f} "
+                    f"{ms(percentile(latencies, 0.5)):>8} {ms(percentile(latencies, 0.95)):>8} "
+                    f"{ms(percentile(latencies, 0.99)):>8} {ms(max(latencies, default=None)):>8} {len(errors):>7}"
+                )
+        finally:
+            connections[ALIAS].close()
+            del connections[ALIAS]
+            del connections.settings[ALIAS]
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def seed(self):
+        connection = connections[ALIAS]
+        with connection.schema_editor() as editor:
+            for model in (Branch, Camera, PersonCount):
+                editor.create_model(model)
+        branch = Branch.objects.using(ALIAS).create(name='benchmark')
+        cameras = [
+            Camera.objects.using(ALIAS).create(branch=branch, stream_url=f'benchmark://{i}').id
+            for i in range(self.options['cameras'])
+        ]
+        start = datetime.now(dt_timezone.utc) - timedelta(days=7)
+        rows = [
+            PersonCount(camera_id=cameras[i % len(cameras)], count=random.randint(0, 20), total_count=i,
+                        timestamp=start + timedelta(seconds=i * 7 * 86400 // max(1, self.options['seed_rows'])))
+            for i in range(self.options['seed_rows'])
+        ]
+        with transaction.atomic(using=ALIAS):
+            PersonCount.objects.using(ALIAS).bulk_create(rows, batch_size=1000)
+        connection.close()
+        return cameras
+
+    def worker(self, operation, pause, cameras, stop, latencies, errors):
+        connection = connections[ALIAS]
+        try:
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    operation(cameras)
+                    latencies.append(time.perf_counter() - start)
+                except OperationalError as e:
+                    errors.append(str(e))
+                # What Django does around each request: persistent
+                # connections stay open, others are closed
+                connection.close_if_unusable_or_obsolete()
+                if pause:
+                    time.sleep(pause)
+        finally:
+            connection.close()
+
+    def write(self, cameras):
+        """A CountWriter batch: one transaction of bulk-inserted samples."""
+        now = datetime.now(dt_timezone.utc)
+        rows = [
+            PersonCount(camera_id=random.choice(cameras), count=random.randint(0, 20), total_count=0, timestamp=now)
+            for _ in range(self.options['batch'])
+        ]
+        with transaction.atomic(using=ALIAS):
+            PersonCount.objects.using(ALIAS).bulk_create(rows)
+
+    def read(self, cameras):
+        """Dashboard queries: a camera's latest count and its last hour."""
+        camera_id = random.choice(cameras)
+        counts = PersonCount.objects.using(ALIAS).filter(camera_id=camera_id)
+        counts.order_by('-timestamp').values_list('count', flat=True).first()
+        counts.filter(timestamp__gte=datetime.now(dt_timezone.utc) - timedelta(hours=1)).aggregate(
+            Avg('count'), Max('count')
+        )
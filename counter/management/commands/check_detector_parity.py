@@ -0,0 +1,49 @@
+# counter/management/commands/check_detector_parity.py
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from counter.utils.detectors import detector_from_settings, build_detector, compare_detectors
+from ._frames import sample_frames
+
+class Command(BaseCommand):
+    help = "Check that an ONNX detector model finds the same people as the PyTorch weights."
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help="Video file, stream URL or image directory.")
+        parser.add_argument('--model', default=getattr(settings, 'COUNTER_ONNX_MODEL', 'yolov8n.onnx'),
+                            help="ONNX model to compare (FP32 or INT8).")
+        parser.add_argument('--frames', type=int, default=50)
+        parser.add_argument('--match-iou', type=float, default=0.5,
+                            help="Minimum IOU for two detections to count as the same person.")
+        parser.add_argument('--min-recall', type=float, default=0.95,
+                            help="Share of the reference detections the model must reproduce.")
+        parser.add_argument('--min-precision', type=float, default=0.95,
+                            help="Share of the model's detections that must exist in the reference.")
+        parser.add_argument('--min-mean-iou', type=float, default=0.9,
+                            help="Smallest allowed mean IOU of matched detections.")
+        parser.add_argument('--max-conf-delta', type=float, default=0.05,
+                            help="Largest allowed mean confidence difference of matched detections.")
+
+    def handle(self, *args, **options):
+        frames = sample_frames(options['source'], options['frames'])
+        if not frames:
+            raise CommandError(f"No frames read from {options['source']}")
+
+        reference = detector_from_settings('torch')
+        candidate = build_detector(
+            'onnx', model_path=options['model'],
+            conf=getattr(settings, 'COUNTER_DETECTOR_CONF', 0.25),
+            iou=getattr(settings, 'COUNTER_DETECTOR_IOU', 0.7),
+            max_det=getattr(settings, 'COUNTER_DETECTOR_MAX_DET', 100),
+        )
+
+        result = compare_detectors(reference, candidate, frames, options['match_iou'])
+        self.stdout.write(
+            f"{len(frames)} frames: {result['expected']} reference / {result['found']} {options['model']} "
+            f"detections, recall {result['recall']:.3f}, precision {result['precision']:.3f}, "
+            f"mean IOU {result['mean_iou']:.3f}, mean conf delta {result['conf_delta']:.4f}"
+        )
+
+        if result['recall'] < options['min_recall'] or result['precision'] < options['min_precision'] \
+                or result['mean_iou'] < options['min_mean_iou'] or result['conf_delta'] > options['max_conf_delta']:
+            raise CommandError("Detector outputs differ beyond tolerance")
+        self.stdout.write(self.style.SUCCESS("Detections match within tolerance"))
@@ -0,0 +1,69 @@
+# counter/management/commands/export_detector.py
+import os
+import shutil
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ._frames import sample_frames
+
+class Command(BaseCommand):
+    help = "Export the YOLO weights to ONNX (FP32) and quantize them to INT8 for the 'onnx' detector backend."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--weights', default=getattr(settings, 'COUNTER_DETECTOR_WEIGHTS', 'yolov8n.pt'),
+                            help="PyTorch weights to export.")
+        parser.add_argument('--output', default=getattr(settings, 'COUNTER_ONNX_MODEL', 'yolov8n.onnx'),
+                            help="Path of the FP32 model; the INT8 model is written next to it as *.int8.onnx.")
+        parser.add_argument('--imgsz', type=int, default=640, help="Inference size.")
+        parser.add_argument('--calibration', default=None,
+                            help="Video or image directory for static INT8 calibration. "
+                                 "Without it the weights are quantized dynamically.")
+        parser.add_argument('--calibration-frames', type=int, default=100)
+        parser.add_argument('--skip-int8', action='store_true', help="Only export the FP32 model.")
+
+    def handle(self, *args, **options):
+        try:
+            from ultralytics import YOLO
+            from onnxruntime import quantization
+        except ImportError as e:
+            raise CommandError(f"Exporting requires ultralytics, onnx and onnxruntime: {e}")
+
+        # dynamic axes so that the scheduler can send batches of any size
+        exported = YOLO(options['weights']).export(
+            format='onnx', imgsz=options['imgsz'], dynamic=True, simplify=False
+        )
+        fp32_path = options['output']
+        if os.path.abspath(exported) != os.path.abspath(fp32_path):
+            shutil.move(exported, fp32_path)
+        self.stdout.write(f"FP32 model: {fp32_path}")
+        if options['skip_int8']:
+            return
+
+        int8_path = os.path.splitext(fp32_path)[0] + '.int8.onnx'
+        if options['calibration']:
+            frames = sample_frames(options['calibration'], options['calibration_frames'])
+            if not frames:
+                raise CommandError(f"No calibration frames read from {options['calibration']}")
+            quantization.quantize_static(
+                fp32_path, int8_path,
+                CalibrationFrames(frames, options['imgsz']),
+                quant_format=quantization.QuantFormat.QDQ,
+                activation_type=quantization.QuantType.QUInt8,
+                weight_type=quantization.QuantType.QInt8,
+                per_channel=True,
+            )
+            self.stdout.write(f"INT8 model (static, {len(frames)} calibration frames): {int8_path}")
+        else:
+            quantization.quantize_dynamic(
+                fp32_path, int8_path, weight_type=quantization.QuantType.QUInt8
+            )
+            self.stdout.write(f"INT8 model (dynamic): {int8_path}")
+
+class CalibrationFrames:
+    """Feeds letterboxed frames one at a time to the static quantizer."""
+    def __init__(self, frames, imgsz):
+        from counter.utils.detectors import preprocess
+        self.batches = iter([preprocess([frame], imgsz)[0] for frame in frames])
+
+    def get_next(self):
+        batch = next(self.batches, None)
+        return None if batch is None else {'images': batch}
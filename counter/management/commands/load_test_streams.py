@@ -0,0 +1,141 @@
+# counter/management/commands/load_test_streams.py
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlencode, urlsplit
+from django.core.management.base import BaseCommand, CommandError
+
+BOUNDARY = b'--frame\r\n'
+
+async def open_request(host, port, path):
+    """Send a GET request and return the reader positioned after the headers."""
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    status = await reader.readline()
+    while (await reader.readline()) not in (b'\r\n', b''):
+        pass
+    parts = status.split()
+    if len(parts) < 2 or parts[1] != b'200':
+        writer.close()
+        raise ConnectionError(f"HTTP {status.decode(errors='replace').strip()}")
+    return reader, writer
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def ms(value):
+    return f"{value * 1000:.0f} ms" if value is not None else "-"
+
+class Command(BaseCommand):
+    help = ("Open many concurrent video feed viewers and stats pollers against a running "
+            "server, e.g. `uvicorn person_counter.asgi:application`, and report what they got.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('stream_url', help="Camera stream URL the viewers ask for.")
+        parser.add_argument('--server', default='http://127.0.0.1:8000')
+        parser.add_argument('--viewers', type=int, default=200)
+        parser.add_argument('--pollers', type=int, default=20,
+                            help="Clients long-polling camera-stats at the same time.")
+        parser.add_argument('--duration', type=float, default=30.0)
+        parser.add_argument('--tier', default='', help="Encode tier for the viewers.")
+        parser.add_argument('--ramp', type=float, default=2.0,
+                            help="Seconds over which the viewers connect.")
+
+    def handle(self, *args, **options):
+        server = urlsplit(options['server'])
+        if server.scheme != 'http' or not server.hostname:
+            raise CommandError("--server must be a plain http:// URL")
+        self.host, self.port = server.hostname, server.port or 80
+        self.options = options
+        viewers, pollers = asyncio.run(self.run())
+        self.report(viewers, pollers)
+
+    async def run(self):
+        options = self.options
+        query = {'url': options['stream_url']}
+        if options['tier']:
+            query['tier'] = options['tier']
+        feed = f"/video-feed/?{urlencode(query)}"
+        deadline = time.monotonic() + options['ramp'] + options['duration']
+
+        tasks = []
+        for i in range(options['viewers']):
+            delay = options['ramp'] * i / max(1, options['viewers'])
+            tasks.append(asyncio.create_task(self.viewer(feed, delay, deadline)))
+        for i in range(options['pollers']):
+            tasks.append(asyncio.create_task(self.poller(options['stream_url'], deadline)))
+        results = await asyncio.gather(*tasks)
+        return results[:options['viewers']], results[options['viewers']:]
+
+    async def viewer(self, path, delay, deadline):
+        await asyncio.sleep(delay)
+        result = {'frames': 0, 'bytes': 0, 'first_frame': None, 'error': None}
+        start = time.monotonic()
+        writer = None
+        try:
+            reader, writer = await open_request(self.host, self.port, path)
+            while time.monotonic() < deadline:
+                chunk = await asyncio.wait_for(reader.read(65536), deadline - time.monotonic())
+                if not chunk:
+                    break
+                frames = chunk.count(BOUNDARY)
+                if frames and result['first_frame'] is None:
+                    result['first_frame'] = time.monotonic() - start
+                result['frames'] += frames
+                result['bytes'] += len(chunk)
+        except asyncio.TimeoutError:
+            pass
+        except (OSError, ConnectionError) as e:
+            result['error'] = str(e)
+        finally:
+            if writer is not None:
+                writer.close()
+        result['seconds'] = time.monotonic() - start
+        return result
+
+    async def poller(self, stream_url, deadline):
+        latencies, errors, seq = [], 0, 0
+        while time.monotonic() < deadline:
+            path = f"/camera-stats/?{urlencode({'url': stream_url, 'wait': 5, 'since': seq})}"
+            start = time.monotonic()
+            writer = None
+            try:
+                reader, writer = await open_request(self.host, self.port, path)
+                body = json.loads(await reader.read())
+                seq = body.get('seq', seq)
+                latencies.append(time.monotonic() - start)
+            except (OSError, ConnectionError, ValueError):
+                errors += 1
+                await asyncio.sleep(1)
+            finally:
+                if writer is not None:
+                    writer.close()
+        return {'latencies': latencies, 'errors': errors}
+
+    def report(self, viewers, pollers):
+        connected = [v for v in viewers if v['error'] is None]
+        failed = [v for v in viewers if v['error'] is not None]
+        fps = [v['frames'] / v['seconds'] for v in connected if v['seconds'] > 0]
+        first = [v['first_frame'] for v in connected if v['first_frame'] is not None]
+        total_bytes = sum(v['bytes'] for v in viewers)
+        duration = max((v['seconds'] for v in viewers), default=0)
+
+        self.stdout.write(f"viewers: {len(connected)} connected, {len(failed)} failed, "
+                          f"{len(first)} received frames")
+        if fps:
+            self.stdout.write(f"  fps per viewer: min {min(fps):.1f}, median {statistics.median(fps):.1f}, "
+                              f"max {max(fps):.1f}")
+        self.stdout.write(f"  first frame: p50 {ms(percentile(first, 0.5))}, p95 {ms(percentile(first, 0.95))}")
+        if duration:
+            self.stdout.write(f"  throughput: {total_bytes * 8 / duration / 1e6:.1f} Mbit/s")
+        for error in sorted({v['error'] for v in failed})[:5]:
+            self.stdout.write(f"  error: {error}")
+
+        latencies = [latency for p in pollers for latency in p['latencies']]
+        self.stdout.write(f"stats pollers: {len(latencies)} responses, {sum(p['errors'] for p in pollers)} errors, "
+                          f"p50 {ms(percentile(latencies, 0.5))}, p95 {ms(percentile(latencies, 0.95))}")
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('counter', '0002_dailystats_unique_visitors_personcount_total_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='camera',
+            name='roi',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
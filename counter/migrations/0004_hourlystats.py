@@ -0,0 +1,41 @@
+# Generated by Django 5.1.15 on 2026-10-17 02:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('counter', '0003_camera_roi'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('samples', models.IntegerField(default=0)),
+                ('total_count', models.IntegerField(default=0)),
+                ('peak_count', models.IntegerField(default=0)),
+                ('unique_visitors', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-hour'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='personcount',
+            index=models.Index(fields=['timestamp', 'id'], name='counter_per_timesta_1f3973_idx'),
+        ),
+        migrations.AddField(
+            model_name='hourlystats',
+            name='branch',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_stats', to='counter.branch'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='hourlystats',
+            unique_together={('branch', 'hour')},
+        ),
+    ]
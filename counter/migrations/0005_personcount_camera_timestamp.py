@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-17 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('counter', '0004_hourlystats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='personcount',
+            index=models.Index(fields=['camera', 'timestamp'], name='counter_per_camera__991f84_idx'),
+        ),
+    ]
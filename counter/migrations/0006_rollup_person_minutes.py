@@ -0,0 +1,49 @@
+# Generated by Django 5.1.15 on 2026-10-17 03:06
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def scale_totals(apps, factor):
+    # Rollups written so far summed the sampled counts; each sample stood for
+    # COUNTER_PERSIST_INTERVAL seconds
+    minutes = getattr(settings, 'COUNTER_PERSIST_INTERVAL', 300.0) / 60
+    HourlyStats = apps.get_model('counter', 'HourlyStats')
+    DailyStats = apps.get_model('counter', 'DailyStats')
+    HourlyStats.objects.update(minutes=F('samples') * minutes, total_count=F('total_count') * minutes ** factor)
+    DailyStats.objects.update(total_count=F('total_count') * minutes ** factor)
+
+
+def to_person_minutes(apps, schema_editor):
+    scale_totals(apps, 1)
+
+
+def to_count_sums(apps, schema_editor):
+    scale_totals(apps, -1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('counter', '0005_personcount_camera_timestamp'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hourlystats',
+            name='minutes',
+            field=models.FloatField(default=0, help_text='Camera-minutes covered by the samples.'),
+        ),
+        migrations.AlterField(
+            model_name='dailystats',
+            name='total_count',
+            field=models.FloatField(default=0, help_text='Person-minutes: the people present summed over the cameras and the minutes of the day, e.g. 3 people for 20 minutes make 60.'),
+        ),
+        migrations.AlterField(
+            model_name='hourlystats',
+            name='total_count',
+            field=models.FloatField(default=0, help_text='Person-minutes: each sampled count times the minutes it stands for (COUNTER_PERSIST_INTERVAL), so it does not depend on the sampling rate.'),
+        ),
+        migrations.RunPython(to_person_minutes, to_count_sums),
+    ]
@@ -13,6 +13,8 @@ class Camera(models.Model):
     branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='cameras')
     stream_url = models.URLField(max_length=500)
     is_active = models.BooleanField(default=True)
+    # Region of interest as [[x, y], ...] normalised to 0..1; null means the full frame
+    roi = models.JSONField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -27,6 +29,12 @@ class PersonCount(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # History queries: one camera over a time range
+            models.Index(fields=['camera', 'timestamp']),
+            # Chunked scans in time order (rebuild_rollups)
+            models.Index(fields=['timestamp', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.camera} - Current: {self.count}, Total: {self.total_count} at {self.timestamp}"
@@ -34,7 +42,10 @@ class PersonCount(models.Model):
 class DailyStats(models.Model):
     branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='daily_stats')
     date = models.DateField()
-    total_count = models.IntegerField(default=0)
+    total_count = models.FloatField(default=0, help_text=(
+        "Person-minutes: the people present summed over the cameras and the "
+        "minutes of the day, e.g. 3 people for 20 minutes make 60."
+    ))
     peak_hour = models.IntegerField(null=True)
     peak_count = models.IntegerField(default=0)
     unique_visitors = models.IntegerField(default=0)  # Added for tracking unique visitors
@@ -44,4 +55,32 @@ class DailyStats(models.Model):
         ordering = ['-date']
 
     def __str__(self):
-        return f"{self.branch.name} - {self.date} - Total: {self.total_count}, Unique: {self.unique_visitors}"
\ No newline at end of file
+        return f"{self.branch.name} - {self.date} - Total: {self.total_count}, Unique: {self.unique_visitors}"
+
+class HourlyStats(models.Model):
+    """
+    Per-branch hourly rollup of the PersonCount samples, kept up to date
+    incrementally by the count writer (see counter/utils/rollups.py).
+    """
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='hourly_stats')
+    hour = models.DateTimeField()  # Start of the hour
+    samples = models.IntegerField(default=0)
+    minutes = models.FloatField(default=0, help_text="Camera-minutes covered by the samples.")
+    total_count = models.FloatField(default=0, help_text=(
+        "Person-minutes: each sampled count times the minutes it stands for "
+        "(COUNTER_PERSIST_INTERVAL), so it does not depend on the sampling rate."
+    ))
+    peak_count = models.IntegerField(default=0)  # Highest count across the branch's cameras
+    unique_visitors = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('branch', 'hour')
+        ordering = ['-hour']
+
+    @property
+    def average_count(self):
+        # Average number of people a camera saw
+        return self.total_count / self.minutes if self.minutes else 0.0
+
+    def __str__(self):
+        return f"{self.branch.name} - {self.hour} - Peak: {self.peak_count}, Unique: {self.unique_visitors}"
@@ -1,3 +1,331 @@
-from django.test import TestCase
+import asyncio
+import importlib.util
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta, timezone as dt_timezone
+import cv2
+import numpy as np
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase
+from sort.sort import (KalmanBoxTracker, Sort, VectorizedSort, associate_detections_to_trackers_gated, iou_batch,
+                       iou_pairs, linear_assignment)
+from .models import Branch, Camera, PersonCount
+from .utils.detectors import build_detector, compare_detectors
+from .utils.history import bucket_width, count_series, page_bounds
+from .utils.pool import FramePool
+from .utils.roi import RegionOfInterest
+from .utils.slot import FrameSlot
 
-# Create your tests here.
+
+def mot_sequence(frames=200, objects=25, seed=0):
+    """
+    Detections of a synthetic MOT-style sequence: people entering and
+    leaving, moving at constant speed with jitter, missed detections and
+    clutter. Returns one (N, 5) [x1, y1, x2, y2, score] array per frame.
+    """
+    rng = np.random.default_rng(seed)
+    starts = rng.integers(0, frames // 2, objects)
+    lengths = rng.integers(10, frames, objects)
+    position = rng.uniform(0, 1200, (objects, 2))
+    velocity = rng.normal(0, 3, (objects, 2))
+    size = rng.uniform(30, 90, (objects, 1)) * np.array([[1.0, 2.5]])
+    sequence = []
+    for frame in range(frames):
+        rows = []
+        for i in range(objects):
+            if starts[i] <= frame < starts[i] + lengths[i] and rng.random() > 0.1:
+                x, y = position[i] + velocity[i] * (frame - starts[i]) + rng.normal(0, 2, 2)
+                w, h = size[i] * rng.uniform(0.9, 1.1, 2)
+                rows.append([x, y, x + w, y + h, rng.uniform(0.3, 1.0)])
+        for _ in range(rng.integers(0, 3)):
+            x, y = rng.uniform(0, 1200, 2)
+            w, h = rng.uniform(20, 80, 2)
+            rows.append([x, y, x + w, y + h, rng.uniform(0.3, 1.0)])
+        sequence.append(np.array(rows).reshape(-1, 5))
+    return sequence
+
+
+class VectorizedSortTests(SimpleTestCase):
+    def track(self, engine, sequence, **options):
+        # Track IDs come from a global counter shared by both engines
+        KalmanBoxTracker.count = 0
+        tracker = engine(**options)
+        return [tracker.update(dets) for dets in sequence]
+
+    def test_matches_sort_id_for_id(self):
+        sequence = mot_sequence()
+        for gated in (False, True):
+            for max_age in (1, 3):
+                options = {'max_age': max_age, 'min_hits': 3, 'iou_threshold': 0.3, 'gated': gated}
+                # The sequence is small enough for the gated association to
+                # always solve densely; force its sparse path instead
+                with self.subTest(**options), mock.patch('sort.sort.DENSE_IOU_LIMIT', 0):
+                    expected = self.track(Sort, sequence, **options)
+                    actual = self.track(VectorizedSort, sequence, **options)
+                    for frame, (want, got) in enumerate(zip(expected, actual)):
+                        np.testing.assert_array_equal(got[:, 4], want[:, 4], err_msg=f"IDs of frame {frame}")
+                        np.testing.assert_allclose(got, want, rtol=1e-7, atol=1e-6, err_msg=f"frame {frame}")
+
+    def test_sparse_association_solves_gated_matrix(self):
+        # Crowded frames: trackers scattered over the image, and detections
+        # near most of them plus clutter
+        rng = np.random.default_rng(2)
+        with mock.patch('sort.sort.DENSE_IOU_LIMIT', 0), \
+                mock.patch('sort.sort.iou_pairs', wraps=iou_pairs) as sparse:
+            for frame in range(50):
+                xy = rng.uniform(0, (1280, 720), (300, 2))
+                trackers = np.hstack((xy, xy + rng.uniform(30, 90, (300, 2)), np.zeros((300, 1))))
+                detections = trackers[rng.random(300) > 0.2] + rng.normal(0, 8, 5)
+                xy = rng.uniform(0, (1280, 720), (20, 2))
+                clutter = np.hstack((xy, xy + rng.uniform(30, 90, (20, 2)), np.ones((20, 1))))
+                detections = np.vstack((detections, clutter))
+                detections[:, 2:4] = np.maximum(detections[:, 2:4], detections[:, :2] + 1)
+
+                # The reference: the Hungarian solver on the IOU matrix with
+                # every pair below the threshold zeroed out
+                iou_matrix = iou_batch(detections, trackers)
+                iou_matrix[iou_matrix < 0.3] = 0
+                expected = linear_assignment(-iou_matrix)
+                expected = expected[iou_matrix[expected[:, 0], expected[:, 1]] > 0]
+
+                matches, unmatched_dets, unmatched_trks = associate_detections_to_trackers_gated(
+                    detections, trackers, 0.3
+                )
+                with self.subTest(frame=frame):
+                    self.assertEqual(sorted(map(tuple, matches)), sorted(map(tuple, expected)))
+                    self.assertEqual(sorted([*matches[:, 0], *unmatched_dets]), list(range(len(detections))))
+                    self.assertEqual(sorted([*matches[:, 1], *unmatched_trks]), list(range(len(trackers))))
+        self.assertEqual(sparse.call_count, 50)
+
+
+    def test_dense_and_sparse_gated_association_agree(self):
+        sequence = mot_sequence(objects=60, seed=1)
+        for engine in (Sort, VectorizedSort):
+            with self.subTest(engine=engine.__name__):
+                with mock.patch('sort.sort.DENSE_IOU_LIMIT', 0):
+                    expected = self.track(engine, sequence, gated=True)
+                with mock.patch('sort.sort.DENSE_IOU_LIMIT', 10 ** 9):
+                    actual = self.track(engine, sequence, gated=True)
+                for frame, (want, got) in enumerate(zip(expected, actual)):
+                    np.testing.assert_array_equal(got, want, err_msg=f"frame {frame}")
+
+class RegionOfInterestTests(SimpleTestCase):
+    # A concave (L-shaped) region, normalised to the frame size
+    POLYGON = [[0.1, 0.1], [0.6, 0.1], [0.6, 0.4], [0.3, 0.4], [0.3, 0.9], [0.1, 0.9]]
+
+    def test_contains_matches_opencv(self):
+        roi = RegionOfInterest(self.POLYGON)
+        frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+        roi.crop(frame)
+        contour = (np.array(self.POLYGON) * (1280, 720)).astype(np.float32)
+        points = np.random.default_rng(0).uniform((0, 0), (1280, 720), (5000, 2))
+        distance = np.array([cv2.pointPolygonTest(contour, (float(x), float(y)), True) for x, y in points])
+        # Points on an edge may go either way
+        clear = np.abs(distance) > 1e-6
+        np.testing.assert_array_equal(roi.contains(points[:, 0], points[:, 1])[clear], distance[clear] > 0)
+
+    def test_crop_and_filter(self):
+        roi = RegionOfInterest(self.POLYGON)
+        frame = np.zeros((100, 200, 3), dtype=np.uint8)
+        crop = roi.crop(frame)
+        self.assertEqual(roi.bounds, (20, 10, 120, 90))
+        self.assertEqual(crop.shape[:2], (80, 100))
+        # In crop coordinates: foot points at (30, 60) and (80, 60) in the
+        # frame, i.e. inside the L's stem and in its cut-out corner
+        detections = [[0, 20, 20, 50, 0.9], [50, 20, 70, 50, 0.8]]
+        np.testing.assert_allclose(roi.filter(detections), [[20, 30, 40, 60, 0.9]], rtol=1e-6)
+        self.assertEqual(roi.filter([]).shape, (0, 5))
+
+    def test_rejects_invalid_polygons(self):
+        for polygon in ([[0, 0], [1, 1]], [[0, 0], [1.5, 0], [1, 1]], [[0, 0, 0], [1, 0, 0], [1, 1, 0]]):
+            with self.subTest(polygon=polygon), self.assertRaises(ValueError):
+                RegionOfInterest(polygon)
+
+
+class FrameSlotTests(SimpleTestCase):
+    def test_replaced_frame_is_recycled_after_its_last_reader(self):
+        pool = FramePool()
+        slot = FrameSlot(refcounted=True)
+        slot.publish(pool.copy(np.full((4, 4), 1, dtype=np.uint8)))
+        seq, _, first = slot.latest()
+        buffer = first.array
+
+        slot.publish(pool.copy(np.full((4, 4), 2, dtype=np.uint8)))
+        # The slot let go of the first frame, but the reader still holds it
+        self.assertEqual(pool.stats()['free'], 0)
+        self.assertTrue((first.array == 1).all())
+        first.release()
+        self.assertIsNone(first.array)
+        self.assertEqual(pool.stats()['free'], 1)
+        # The next copy reuses the recycled buffer
+        self.assertIs(pool.copy(np.zeros((4, 4), dtype=np.uint8)).array, buffer)
+
+        slot.close()
+        self.assertIsNone(slot.latest())
+        self.assertEqual(pool.stats()['free'], 1)
+
+    def test_wait_newer(self):
+        slot = FrameSlot()
+        self.assertIsNone(slot.wait_newer(0, timeout=0.01))
+        threading.Timer(0.05, slot.publish, args=('frame',)).start()
+        seq, _, frame = slot.wait_newer(0, timeout=5)
+        self.assertEqual((seq, frame), (1, 'frame'))
+        self.assertIsNone(slot.wait_newer(seq, timeout=0.01))
+        threading.Timer(0.05, slot.close).start()
+        start = time.monotonic()
+        self.assertIsNone(slot.wait_newer(seq, timeout=5))
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_wait_newer_async(self):
+        slot = FrameSlot()
+
+        async def wait():
+            self.assertIsNone(await slot.wait_newer_async(0, timeout=0.01))
+            threading.Timer(0.05, slot.publish, args=('frame',)).start()
+            return await slot.wait_newer_async(0, timeout=5)
+
+        seq, _, frame = asyncio.run(wait())
+        self.assertEqual((seq, frame), (1, 'frame'))
+
+    def test_frames_are_not_recycled_while_in_use(self):
+        # Each frame is filled with its sequence number; a buffer recycled
+        # and overwritten while a reader holds it would show another number
+        pool = FramePool(max_free=2)
+        slot = FrameSlot(refcounted=True)
+        errors, done = [], threading.Event()
+
+        def read():
+            seq = 0
+            while not done.is_set():
+                entry = slot.wait_newer(seq, timeout=0.1)
+                if entry is None:
+                    continue
+                seq, _, frame = entry
+                time.sleep(0.0005)
+                if frame.array is None or not (frame.array == seq % 256).all():
+                    errors.append(seq)
+                frame.release()
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        frames = []
+        for seq in range(1, 2001):
+            frames.append(pool.copy(np.full((16, 16), seq % 256, dtype=np.uint8)))
+            slot.publish(frames[-1])
+        done.set()
+        for reader in readers:
+            reader.join()
+        slot.close()
+
+        self.assertEqual(errors, [])
+        # Every frame was handed back once its last holder released it
+        self.assertTrue(all(frame.array is None for frame in frames))
+        self.assertGreater(pool.stats()['reused'], 0)
+
+
+class CountSeriesTests(TestCase):
+    START = datetime(2026, 10, 15, tzinfo=dt_timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        branch = Branch.objects.create(name='Test')
+        cls.a = Camera.objects.create(branch=branch, stream_url='rtsp://a')
+        cls.b = Camera.objects.create(branch=branch, stream_url='rtsp://b')
+        rows = []
+        # Camera a: a sample every minute (half a second past it) for 30
+        # minutes, counting 0..4 over and over; its tracker restarts at
+        # minute 15
+        for minute in range(30):
+            rows.append(PersonCount(
+                camera=cls.a, count=minute % 5, total_count=minute if minute < 15 else minute - 15,
+                timestamp=cls.START + timedelta(minutes=minute, seconds=0.5)
+            ))
+        # Camera b: a steady 10 people, sampled every two minutes
+        for step in range(15):
+            rows.append(PersonCount(
+                camera=cls.b, count=10, total_count=100 + step,
+                timestamp=cls.START + timedelta(minutes=2 * step)
+            ))
+        PersonCount.objects.bulk_create(rows)
+        cls.start = int(cls.START.timestamp())
+        cls.end = cls.start + 30 * 60
+
+    def series(self, camera_ids, **options):
+        return count_series(camera_ids, self.start, self.end, 600, **options)
+
+    def test_bucket_width(self):
+        self.assertEqual(bucket_width(0, 1800, 3), 600)
+        self.assertEqual(bucket_width(0, 1801, 3), 601)
+        self.assertEqual(bucket_width(0, 1800, 3, resolution=60), 60)
+        self.assertEqual(bucket_width(0, 10, 100), 1)
+        self.assertEqual(page_bounds(1000, 5000, 600, 2), (600, 1800, 1800))
+        self.assertEqual(page_bounds(1000, 5000, 600, 10, cursor=4200), (4200, 5000, None))
+
+    def test_single_camera(self):
+        points, next_cursor = self.series([self.a.id])
+        self.assertIsNone(next_cursor)
+        self.assertEqual([point['time'] for point in points], [
+            (self.START + timedelta(minutes=10 * i)).isoformat() for i in range(3)
+        ])
+        for point in points:
+            self.assertEqual((point['min'], point['max'], point['avg'], point['samples']), (0, 4, 2.0, 10))
+        # The highest total of each bucket; the restart's bucket ends at 4
+        self.assertEqual([point['max_total'] for point in points], [9, 14, 14])
+
+    def test_branch_sums_cameras(self):
+        points, _ = self.series([self.a.id, self.b.id])
+        for point in points:
+            self.assertEqual((point['min'], point['max'], point['avg'], point['samples']), (10, 14, 12.0, 15))
+        self.assertEqual([point['max_total'] for point in points], [9 + 104, 14 + 109, 14 + 114])
+
+    def test_pagination_covers_the_range(self):
+        expected, _ = self.series([self.a.id, self.b.id])
+        points, cursor, pages = [], None, 0
+        while True:
+            page, cursor = self.series([self.a.id, self.b.id], limit=1, cursor=cursor)
+            points += page
+            pages += 1
+            if cursor is None:
+                break
+        self.assertEqual(pages, 3)
+        self.assertEqual(points, expected)
+
+    def test_empty_range(self):
+        self.assertEqual(count_series([self.a.id], self.end, self.end + 600, 600), ([], None))
+
+
+WEIGHTS = getattr(settings, 'COUNTER_DETECTOR_WEIGHTS', 'yolov8n.pt')
+ONNX_MODEL = getattr(settings, 'COUNTER_ONNX_MODEL', 'yolov8n.onnx')
+
+
+@unittest.skipUnless(importlib.util.find_spec('onnxruntime'), "onnxruntime is not installed")
+@unittest.skipUnless(os.path.exists(WEIGHTS) and os.path.exists(ONNX_MODEL),
+                     f"{WEIGHTS} or {ONNX_MODEL} not found")
+class DetectorParityTests(SimpleTestCase):
+    """
+    The ONNX export must find the same people as the PyTorch weights. Runs
+    against COUNTER_DETECTOR_WEIGHTS and COUNTER_ONNX_MODEL.
+    """
+    def test_onnx_matches_torch(self):
+        from ultralytics.utils import ASSETS
+        frames = [cv2.imread(str(ASSETS / name)) for name in ('bus.jpg', 'zidane.jpg')]
+        # A 720p frame takes the letterbox's other padding direction
+        frames.append(cv2.resize(frames[0], (1280, 720)))
+        options = {
+            'conf': getattr(settings, 'COUNTER_DETECTOR_CONF', 0.25),
+            'iou': getattr(settings, 'COUNTER_DETECTOR_IOU', 0.7),
+            'max_det': getattr(settings, 'COUNTER_DETECTOR_MAX_DET', 100),
+        }
+        reference = build_detector('torch', weights=WEIGHTS, **options)
+        candidate = build_detector('onnx', model_path=ONNX_MODEL, **options)
+
+        result = compare_detectors(reference, candidate, frames)
+        self.assertGreater(result['expected'], 0)
+        self.assertGreaterEqual(result['recall'], 0.95)
+        self.assertGreaterEqual(result['precision'], 0.95)
+        self.assertGreaterEqual(result['mean_iou'], 0.9)
+        self.assertLessEqual(result['conf_delta'], 0.05)
@@ -10,10 +10,15 @@ urlpatterns = [
     
     # Video and stats endpoints
     path('video-feed/', views.video_feed, name='video_feed'),
+    path('video-tracks/', views.video_tracks, name='video_tracks'),
     path('camera-stats/', views.get_camera_stats, name='camera_stats'),
+    path('branch-stream/', views.branch_stats_stream, name='branch_stats_stream'),
     path('update-stats/', views.update_stats, name='update_stats'),
     
     # Utility endpoints
     path('stream-info/', views.get_stream_url_info, name='stream_info'),
     path('check-status/', views.check_stream_status, name='check_status'),
+    path('pipeline-stats/', views.pipeline_stats, name='pipeline_stats'),
+    path('branch-rollups/', views.branch_rollups, name='branch_rollups'),
+    path('history/', views.count_history, name='count_history'),
 ]
\ No newline at end of file
@@ -0,0 +1,59 @@
+# counter/utils/annotator.py
+import cv2
+import numpy as np
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+def build_palette(size=64):
+    """
+    BGR colors with hues spread by the golden ratio, so consecutive track
+    IDs get clearly different colors.
+    """
+    hues = (np.arange(size) * 0.618033988749895 % 1.0 * 180).astype(np.uint8)
+    hsv = np.stack([hues, np.full(size, 255, np.uint8), np.full(size, 255, np.uint8)], axis=1)
+    bgr = cv2.cvtColor(hsv[None], cv2.COLOR_HSV2BGR)[0]
+    return [tuple(int(c) for c in color) for color in bgr]
+
+class Annotator:
+    """
+    Draws the track boxes, ID labels and counters onto a frame in a single
+    CPU pass. Colors come from a fixed palette and label sizes are measured
+    once per ID.
+    """
+    def __init__(self, label_scale=0.7, count_scale=1, thickness=2, max_labels=4096):
+        self.label_scale = label_scale
+        self.count_scale = count_scale
+        self.thickness = thickness
+        self.max_labels = max_labels
+        self.palette = build_palette()
+        self._labels = {}
+
+    def color(self, track_id):
+        return self.palette[track_id % len(self.palette)]
+
+    def label(self, track_id):
+        """Return the label text of a track and its (width, height)."""
+        label = self._labels.get(track_id)
+        if label is None:
+            if len(self._labels) >= self.max_labels:
+                self._labels.clear()
+            text = f'ID: {track_id}'
+            label = (text, cv2.getTextSize(text, FONT, self.label_scale, self.thickness)[0])
+            self._labels[track_id] = label
+        return label
+
+    def draw(self, frame, tracked_objects, current_count, total_unique):
+        """Annotate ``frame`` in place and return it."""
+        boxes = np.asarray(tracked_objects).astype(int, copy=False)
+        for x1, y1, x2, y2, track_id in boxes.tolist():
+            color = self.color(track_id)
+            text, (text_w, text_h) = self.label(track_id)
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, self.thickness)
+            cv2.rectangle(frame, (x1, y1 - text_h - 8), (x1 + text_w, y1), color, -1)
+            cv2.putText(frame, text, (x1, y1 - 5), FONT, self.label_scale, (255, 255, 255), self.thickness)
+
+        cv2.putText(frame, f'Current Count: {current_count}', (20, 40),
+                    FONT, self.count_scale, (0, 255, 0), self.thickness)
+        cv2.putText(frame, f'Total Unique: {total_unique}', (20, 80),
+                    FONT, self.count_scale, (0, 255, 0), self.thickness)
+        return frame
@@ -0,0 +1,296 @@
+# counter/utils/broadcaster.py
+import json
+import time
+import threading
+import logging
+from .slot import FrameSlot
+from .encoding import EncodeTier
+
+logger = logging.getLogger(__name__)
+
+# What a subscription receives: JPEGs with the boxes drawn by the server,
+# un-annotated JPEGs for viewers that draw the overlay themselves, or the
+# track list that goes with them as JSON
+ANNOTATED = 'annotated'
+RAW = 'raw'
+TRACKS = 'tracks'
+CHANNELS = (ANNOTATED, RAW, TRACKS)
+
+# Encode tiers used when none are configured
+DEFAULT_TIERS = {'full': {}}
+
+class Subscription:
+    """
+    A single viewer of a FrameBroadcaster. Each call to next_frame() returns
+    the newest item of the subscribed channel and encode tier the viewer has
+    not seen yet, so the viewer's cursor into the slot acts as its own
+    latest-frame slot: frames a slow client could not take in time are
+    dropped rather than queued, and the pipeline never waits for it. The
+    send rate, drops and lag of each viewer are tracked.
+    """
+    def __init__(self, broadcaster, channel=ANNOTATED, tier=None):
+        self.broadcaster = broadcaster
+        self.channel = channel
+        self.tier = tier
+        # Slot key; the track list has no tiers
+        self.key = (channel, tier if channel != TRACKS else None)
+        self.last_seq = 0
+        self.closed = False
+        self.started = time.monotonic()
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.avg_lag = 0.0
+        self.max_lag = 0.0
+
+    def next_frame(self, timeout=None):
+        """
+        Return (frame_bytes, current_count, total_count), or the JSON track
+        list on the tracks channel, or None if nothing new was published
+        within ``timeout``.
+        """
+        entry = self.broadcaster.slots[self.key].wait_newer(self.last_seq, timeout)
+        return self._deliver(entry)
+
+    async def next_frame_async(self, timeout=None):
+        """next_frame() for async views; waits without holding a thread."""
+        entry = await self.broadcaster.slots[self.key].wait_newer_async(self.last_seq, timeout)
+        return self._deliver(entry)
+
+    def _deliver(self, entry):
+        if entry is None:
+            return None
+        seq, timestamp, payload = entry
+        if self.last_seq and seq > self.last_seq + 1:
+            # Published while the client was still busy with the last one
+            self.frames_dropped += seq - self.last_seq - 1
+        self.last_seq = seq
+        self.frames_sent += 1
+
+        # Age of the frame when handed to the client
+        lag = max(0.0, time.time() - timestamp)
+        alpha = 0.1 if self.frames_sent > 1 else 1.0
+        self.avg_lag += alpha * (lag - self.avg_lag)
+        self.max_lag = max(self.max_lag, lag)
+        return payload
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started
+        offered = self.frames_sent + self.frames_dropped
+        return {
+            'channel': self.channel,
+            'tier': self.tier if self.channel != TRACKS else None,
+            'frames_sent': self.frames_sent,
+            'frames_dropped': self.frames_dropped,
+            'drop_ratio': round(self.frames_dropped / offered, 3) if offered else 0.0,
+            'send_fps': round(self.frames_sent / elapsed, 2) if elapsed > 0 else 0.0,
+            'avg_lag_ms': round(self.avg_lag * 1000, 1),
+            'max_lag_ms': round(self.max_lag * 1000, 1),
+        }
+
+    @property
+    def active(self):
+        return not self.closed and self.broadcaster.is_running
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.broadcaster.unsubscribe(self)
+
+class FrameBroadcaster:
+    """
+    Runs the detect -> track -> annotate -> encode pipeline once per frame
+    for a single camera and fans the encoded JPEG out to every subscriber,
+    so the cost per camera stays flat no matter how many viewers are open.
+    Each channel and encode tier is only produced while it has subscribers,
+    and at most once per frame; raw frames are encoded once per tier and
+    shared by all overlay viewers.
+    """
+    def __init__(self, camera_id, stream, counter, results=None, scheduler=None,
+                 on_idle=None, frame_timeout=1.0, tiers=None, default_tier=None, writer=None):
+        self.camera_id = camera_id
+        self.stream = stream
+        self.counter = counter
+        self.results = results
+        self.writer = writer
+        self.scheduler = scheduler
+        self.on_idle = on_idle
+        self.frame_timeout = frame_timeout
+        tiers = tiers or DEFAULT_TIERS
+        self.default_tier = default_tier if default_tier in tiers else next(iter(tiers))
+        self.encoders = {
+            (channel, name): EncodeTier(name, **options)
+            for channel in (ANNOTATED, RAW)
+            for name, options in tiers.items()
+        }
+        self.slots = {key: FrameSlot() for key in self.encoders}
+        self.slots[(TRACKS, None)] = FrameSlot()
+        self.subscribers = set()
+        self.frames_processed = 0
+        self.frames_skipped = 0
+        self.frames_metadata_only = 0
+        self.lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"pipeline-{camera_id}",
+            daemon=True
+        )
+
+    @property
+    def is_running(self):
+        return self._thread.is_alive() and not self._stopped.is_set()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def subscribe(self, channel=ANNOTATED, tier=None):
+        subscription = Subscription(self, channel, tier or self.default_tier)
+        if subscription.key not in self.slots:
+            raise ValueError(f"Unknown channel {channel!r} or encode tier {tier!r}")
+        with self.lock:
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+            idle = not self.subscribers
+        if idle and self.on_idle is not None:
+            self.on_idle(self)
+
+    def channel_viewers(self):
+        """Number of subscribers per (channel, tier) slot key."""
+        with self.lock:
+            subscribers = list(self.subscribers)
+        viewers = dict.fromkeys(self.slots, 0)
+        for subscription in subscribers:
+            viewers[subscription.key] += 1
+        return viewers
+
+    def _track_list(self, seq, timestamp, frame, current_count, total_count):
+        """Compact JSON description of the tracks drawn onto a frame."""
+        context = self.counter.contexts.get(self.camera_id)
+        tracks = context.tracks if context is not None else []
+        return json.dumps({
+            'seq': seq,
+            'time': timestamp,
+            'width': frame.shape[1],
+            'height': frame.shape[0],
+            'count': current_count,
+            'total': total_count,
+            # [x1, y1, x2, y2, track_id] in frame pixels
+            'tracks': [[int(v) for v in track] for track in tracks],
+        }, separators=(',', ':'))
+
+    def _encode(self, keys, frame, current_count, total_count, timestamp):
+        for key in keys:
+            data = self.encoders[key].encode(frame)
+            if data is not None:
+                self.slots[key].publish((data, current_count, total_count), timestamp)
+
+    def stats(self):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        stats = {
+            'viewers': len(subscribers),
+            'viewer_stats': [subscription.stats() for subscription in subscribers],
+            'channel_viewers': {
+                ':'.join(filter(None, key)): count
+                for key, count in self.channel_viewers().items() if count
+            },
+            'encoders': {
+                ':'.join(key): encoder.stats()
+                for key, encoder in self.encoders.items() if encoder.frames_encoded
+            },
+            'frames_processed': self.frames_processed,
+            'frames_decoded': getattr(self.stream, 'frames_decoded', 0),
+            'frames_skipped': self.frames_skipped,
+            'frames_metadata_only': self.frames_metadata_only,
+        }
+        # Frame bytes memcpy'd per frame: the copy out of the decoder plus
+        # the annotation copy when a viewer is attached
+        bytes_copied = 0
+        pool = getattr(self.stream, 'pool', None)
+        if pool is not None:
+            stats['decode_pool'] = pool.stats()
+            bytes_copied += pool.bytes_copied // max(1, pool.copies)
+        context = self.counter.contexts.get(self.camera_id)
+        if context is not None:
+            stats.update(context.stats())
+            stats['annotate_pool'] = context.frame_pool.stats()
+            bytes_copied += context.frame_pool.bytes_copied // max(1, self.frames_processed)
+        stats['bytes_copied_per_frame'] = bytes_copied
+        return stats
+
+    def _detect(self, frame):
+        # Detection goes through the shared batching scheduler when one is
+        # configured
+        if self.scheduler is not None:
+            return self.scheduler.detect(self.camera_id, frame)
+        return self.counter.detect_batch([frame])[0]
+
+    def _run(self):
+        last_seq = 0
+        while not self._stopped.is_set():
+            try:
+                entry = self.stream.read_latest(last_seq, self.frame_timeout)
+                if entry is None:
+                    # Stream stalled or is reconnecting
+                    self._stopped.wait(0.1)
+                    continue
+                if last_seq and entry[0] > last_seq + 1:
+                    # Frames decoded while we were busy are never processed
+                    self.frames_skipped += entry[0] - last_seq - 1
+                last_seq, timestamp, pooled = entry
+
+                # Only draw and encode the tiers someone is watching and
+                # whose frame rate cap allows another frame
+                viewers = self.channel_viewers()
+                now = time.monotonic()
+                due = [key for key, encoder in self.encoders.items()
+                       if viewers[key] and encoder.due(now)]
+                annotated = [key for key in due if key[0] == ANNOTATED]
+                raw = [key for key in due if key[0] == RAW]
+                annotate = bool(annotated)
+                try:
+                    processed_frame, current_count, total_count = self.counter.process_frame(
+                        pooled.array, self.camera_id, self._detect, annotate=annotate
+                    )
+                    if processed_frame is None:
+                        continue
+                    if self.results is not None:
+                        self.results.publish(self.camera_id, current_count, total_count, timestamp)
+                    if self.writer is not None:
+                        self.writer.record(self.camera_id, self.stream.stream_url, current_count, total_count, timestamp)
+                    self.frames_processed += 1
+
+                    if viewers[(TRACKS, None)]:
+                        self.slots[(TRACKS, None)].publish(self._track_list(
+                            last_seq, timestamp, pooled.array, current_count, total_count
+                        ), timestamp)
+                    # Overlay viewers draw the boxes themselves
+                    self._encode(raw, pooled.array, current_count, total_count, timestamp)
+                finally:
+                    # The annotated copy is separate, so the decode buffer
+                    # can go back to the stream's pool right away
+                    pooled.release()
+
+                if annotate:
+                    self._encode(annotated, processed_frame, current_count, total_count, timestamp)
+                elif not raw:
+                    # Nothing drawn or encoded: every due subscriber only
+                    # takes the track list (or the frame-rate caps skipped
+                    # this frame). The pipeline stops with its last
+                    # subscriber, so there is no viewer-less mode.
+                    self.frames_metadata_only += 1
+            except Exception as e:
+                logger.error(f"Error in pipeline for camera {self.camera_id}: {e}")
+                self._stopped.wait(1)
+
+    def stop(self):
+        self._stopped.set()
+        for slot in self.slots.values():
+            slot.close()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.frame_timeout * 2)
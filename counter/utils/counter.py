@@ -1,26 +1,53 @@
 # counter/utils/counter.py
+import atexit
 import cv2
-import numpy as np
-from ultralytics import YOLO
-from datetime import datetime
-from ..models import PersonCount, Camera
-from sort.sort import Sort
+from django.conf import settings
+from ..models import Camera
 import threading
 import time
 import logging
 import torch
+from .slot import FrameSlot
+from .pool import FramePool
+from .broadcaster import FrameBroadcaster, ANNOTATED
+from .results import ResultStore
+from .persistence import CountWriter
+from .scheduler import InferenceScheduler
+from .tracking import TrackingContext
+from .motion import MotionGate
+from .roi import RegionOfInterest
+from .detectors import detector_from_settings
+from .annotator import Annotator
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class VideoStream:
-    def __init__(self, stream_url):
+    def __init__(self, stream_url, threaded=True, read_timeout=5.0, reconnect_delay=1.0):
         self.stream_url = stream_url
-        self.lock = threading.Lock()
+        # Re-entrant: read() reconnects while already holding the lock
+        self.lock = threading.RLock()
         self.cap = None
         self.last_frame = None
         self.last_read_time = None
         self.is_running = False
+
+        # Background capture: a dedicated thread decodes continuously and only
+        # the newest frame is kept, so slow consumers never back up the
+        # RTSP buffer.
+        self.threaded = threaded
+        self.read_timeout = read_timeout
+        self.reconnect_delay = reconnect_delay
+        # Frames are decoded into reused buffers; the slot and every consumer
+        # hold a reference until they are done with a frame
+        self.pool = FramePool()
+        self.slot = FrameSlot(refcounted=True)
+        self.last_seq = 0
+        self.frames_decoded = 0
+        self.frames_dropped = 0
+        self._stopped = threading.Event()
+        self._reader_thread = None
+        self._last_pooled = None
         
         # Enable CUDA for OpenCV if available
         self.use_cuda = cv2.cuda.getCudaEnabledDeviceCount() > 0
@@ -28,6 +55,13 @@ class VideoStream:
             self.gpu_stream = cv2.cuda_Stream()
             logger.info("CUDA is available for video processing")
         self._connect()
+        if self.threaded:
+            self._reader_thread = threading.Thread(
+                target=self._reader_loop,
+                name=f"capture-{self.stream_url}",
+                daemon=True
+            )
+            self._reader_thread.start()
 
     def _connect(self):
         try:
@@ -50,7 +84,87 @@ class VideoStream:
             self.is_running = False
             raise
 
+    def _reader_loop(self):
+        while not self._stopped.is_set():
+            cap = self.cap
+            buffer = self.pool.acquire()
+            try:
+                if cap is None:
+                    ret, frame = False, None
+                elif buffer is not None:
+                    # Decode straight into a recycled buffer of the same size
+                    ret, frame = cap.read(buffer)
+                else:
+                    ret, frame = cap.read()
+            except Exception as e:
+                logger.error(f"Error reading frame: {e}")
+                ret, frame = False, None
+
+            if self._stopped.is_set() or not ret:
+                self.pool.recycle(buffer)
+            if self._stopped.is_set():
+                break
+
+            if not ret:
+                logger.warning("Failed to read frame, attempting reconnection...")
+                if self._stopped.wait(self.reconnect_delay):
+                    break
+                try:
+                    self._connect()
+                except Exception:
+                    # Keep retrying until release() is called
+                    pass
+                continue
+
+            if frame is not buffer:
+                # First frame or a resolution change: adopt the new array
+                self.pool.allocated += 1
+            self.pool.record_copy(frame.nbytes)
+            self.slot.publish(self.pool.wrap(frame))
+            self.frames_decoded += 1
+
+        # The capture is only ever read here, so it is released here too:
+        # cv2.VideoCapture is not thread-safe and release() must not pull it
+        # out from under a read that is still blocked
+        self._release_capture()
+        self.slot.close()
+
+    def _release_capture(self):
+        with self.lock:
+            if self.cap is not None:
+                self.cap.release()
+                self.cap = None
+
+    def read_latest(self, after_seq=0, timeout=None):
+        """
+        Return (seq, timestamp, frame) for the newest frame published after
+        ``after_seq`` or None if nothing newer arrived within ``timeout``.
+        ``frame`` is a PooledFrame the caller must release() when done.
+        """
+        if not self.threaded:
+            ret, frame = self.read()
+            return (self.last_seq, self.last_read_time, self.pool.wrap(frame)) if ret else None
+        return self.slot.wait_newer(after_seq, timeout)
+
     def read(self):
+        if self.threaded:
+            if self._stopped.is_set():
+                return False, None
+            entry = self.read_latest(self.last_seq, self.read_timeout)
+            if entry is None:
+                return False, None
+            seq, timestamp, pooled = entry
+            if self.last_seq and seq > self.last_seq + 1:
+                self.frames_dropped += seq - self.last_seq - 1
+            # The returned frame stays valid until the next read()
+            if self._last_pooled is not None:
+                self._last_pooled.release()
+            self._last_pooled = pooled
+            self.last_seq = seq
+            self.last_frame = pooled.array
+            self.last_read_time = timestamp
+            return True, pooled.array
+
         if not self.is_running:
             return False, None
 
@@ -60,15 +174,7 @@ class VideoStream:
             try:
                 ret, frame = self.cap.read()
                 if ret:
-                    if self.use_cuda:
-                        # Upload frame to GPU memory
-                        gpu_frame = cv2.cuda_GpuMat()
-                        gpu_frame.upload(frame)
-                        # Process frame on GPU
-                        gpu_frame = cv2.cuda.cvtColor(gpu_frame, cv2.COLOR_BGR2RGB)
-                        # Download back to CPU if needed
-                        frame = gpu_frame.download()
-                    
+                    self.last_seq += 1
                     self.last_frame = frame
                     self.last_read_time = time.time()
                     return True, frame
@@ -81,11 +187,22 @@ class VideoStream:
                 return False, None
 
     def release(self):
+        self._stopped.set()
+        self.is_running = False
+        reader = self._reader_thread
+        self._reader_thread = None
+        if not self.threaded:
+            self._release_capture()
+        elif reader is not None and reader is not threading.current_thread():
+            reader.join(timeout=self.read_timeout)
+            if reader.is_alive():
+                logger.warning(f"Capture of {self.stream_url} is still blocked in a read; "
+                               f"it will be released when the read returns")
         with self.lock:
-            self.is_running = False
-            if self.cap is not None:
-                self.cap.release()
-                self.cap = None
+            if self._last_pooled is not None:
+                self._last_pooled.release()
+                self._last_pooled = None
+        self.slot.close()
 
 class PersonCounter:
     def __init__(self):
@@ -93,19 +210,22 @@ class PersonCounter:
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         logger.info(f"Using device: {self.device}")
         
-        # Initialize YOLO model with GPU support
-        self.model = YOLO('yolov8n.pt')
-        self.model.to(self.device)  # Move model to GPU
-        
-        # Configure YOLO for GPU inference
-        self.model.conf = 0.25
-        self.model.classes = [0]  # person class
-        self.model.max_det = 100  # maximum detections per frame
-        
-        self.person_class_id = 0
-        self.tracker = Sort(max_age=20, min_hits=3, iou_threshold=0.25)
-        self.unique_ids = set()
-        self.colors = {}
+        # Detector backend (PyTorch or ONNX Runtime) chosen in settings
+        self.detector = detector_from_settings(device=self.device)
+        logger.info(f"Using detector backend: {self.detector.name}")
+        self.annotator = Annotator()
+        if getattr(settings, 'COUNTER_DETECTOR_WARMUP', True):
+            self.detector.warmup(batch_size=getattr(settings, 'COUNTER_BATCH_SIZE', 8))
+
+        # Per-camera tracker state, created on first use and evicted when the
+        # camera stops; the lock only guards the dict itself
+        self.contexts = {}
+        self.tracker_engine = getattr(settings, 'COUNTER_TRACKER_ENGINE', 'vectorized')
+        self.detection_stride = getattr(settings, 'COUNTER_DETECTION_STRIDE', 1)
+        self.adaptive_stride = getattr(settings, 'COUNTER_ADAPTIVE_STRIDE', True)
+        self.motion_gate = getattr(settings, 'COUNTER_MOTION_GATE', True)
+        self.motion_threshold = getattr(settings, 'COUNTER_MOTION_THRESHOLD', 0.002)
+        self.motion_refresh = getattr(settings, 'COUNTER_MOTION_REFRESH', 5.0)
         self.lock = threading.Lock()
         
         # Initialize CUDA image processing if available
@@ -116,142 +236,76 @@ class PersonCounter:
             self.gpu_cvtColor = cv2.cuda.cvtColor
             logger.info("CUDA enabled for image processing")
 
-    def _get_color(self, track_id):
+    def get_context(self, camera_id, detection_stride=None, roi=None):
+        context = self.contexts.get(camera_id)
+        if context is None:
+            with self.lock:
+                context = self.contexts.get(camera_id)
+                if context is None:
+                    context = TrackingContext(
+                        camera_id,
+                        engine=self.tracker_engine,
+                        detection_stride=detection_stride or self.detection_stride,
+                        adaptive_stride=self.adaptive_stride,
+                        motion_gate=MotionGate(
+                            min_changed=self.motion_threshold,
+                            refresh_interval=self.motion_refresh
+                        ) if self.motion_gate else None,
+                        roi=roi
+                    )
+                    self.contexts[camera_id] = context
+        return context
+
+    def release_context(self, camera_id):
         with self.lock:
-            if track_id not in self.colors:
-                hue = np.random.randint(0, 180)
-                self.colors[track_id] = tuple([int(x) for x in cv2.cvtColor(np.uint8([[[hue, 255, 255]]]), cv2.COLOR_HSV2BGR)[0][0]])
-            return self.colors[track_id]
+            self.contexts.pop(camera_id, None)
 
-    def process_frame(self, frame, camera_id):
+    def detect_batch(self, frames):
+        """
+        Run the detector over a list of frames in a single forward pass and
+        return the person detections [x1, y1, x2, y2, conf] for each frame.
+        """
+        return self.detector.detect_batch(frames)
+
+    def process_frame(self, frame, camera_id, detect=None, annotate=True):
+        """
+        Track and annotate a frame. ``detect`` maps a frame to its
+        detections, e.g. through the batched inference scheduler; by default
+        the model is run here. It is only called when the camera's context
+        needs fresh detections for this frame.
+
+        ``frame`` is never modified. With ``annotate`` the drawing goes onto
+        a pooled copy that stays valid until the camera's next frame;
+        without it the frame is returned as is.
+        """
         if frame is None:
             return None, 0, 0
 
         try:
-            # Convert frame to GPU tensor if using CUDA
-            if self.use_cuda:
-                gpu_frame = cv2.cuda_GpuMat()
-                gpu_frame.upload(frame)
-                
-                # Perform GPU-accelerated preprocessing
-                gpu_frame = self.gpu_cvtColor(gpu_frame, cv2.COLOR_BGR2RGB)
-                frame = gpu_frame.download()
-
-            # Run inference on GPU
-            with torch.cuda.amp.autocast():  # Enable automatic mixed precision
-                results = self.model(frame, verbose=False)
-
-            # Process detections
-            detections = []
-            for r in results[0].boxes.data:
-                x1, y1, x2, y2, conf, cls = r
-                if int(cls) == self.person_class_id:
-                    detections.append([x1, y1, x2, y2, conf])
-
-            # Update tracker
-            with self.lock:
-                if len(detections) > 0:
-                    tracked_objects = self.tracker.update(np.array(detections))
-                else:
-                    tracked_objects = np.empty((0, 5))
-
-            # Create GPU mat for annotated frame if using CUDA
-            if self.use_cuda:
-                annotated_frame = cv2.cuda_GpuMat()
-                annotated_frame.upload(frame.copy())
-            else:
-                annotated_frame = frame.copy()
+            # Frames skipped by the detection stride or the motion gate do
+            # not run the model. With an ROI only its bounding crop is
+            # inspected and detected on.
+            context = self.get_context(camera_id)
+            region = context.roi.crop(frame) if context.roi is not None else frame
+            detections = None
+            if context.needs_inference(region):
+                detections = detect(region) if detect is not None else self.detect_batch([region])[0]
+                if context.roi is not None:
+                    detections = context.roi.filter(detections)
 
-            current_ids = set()
-
-            for track in tracked_objects:
-                x1, y1, x2, y2, track_id = track
-                track_id = int(track_id)
-                current_ids.add(track_id)
-                
-                with self.lock:
-                    self.unique_ids.add(track_id)
-                
-                color = self._get_color(track_id)
-                
-                # Draw annotations (on CPU as CUDA drawing operations are limited)
-                if self.use_cuda:
-                    annotated_frame = annotated_frame.download()
-                
-                cv2.rectangle(
-                    annotated_frame,
-                    (int(x1), int(y1)),
-                    (int(x2), int(y2)),
-                    color,
-                    2
-                )
-                
-                text = f'ID: {track_id}'
-                text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)[0]
-                cv2.rectangle(
-                    annotated_frame,
-                    (int(x1), int(y1) - text_size[1] - 8),
-                    (int(x1) + text_size[0], int(y1)),
-                    color,
-                    -1
-                )
-                cv2.putText(
-                    annotated_frame,
-                    text,
-                    (int(x1), int(y1) - 5),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.7,
-                    (255, 255, 255),
-                    2
-                )
+            # Update this camera's tracker
+            with context.lock:
+                tracked_objects = context.update(detections)
+                current_count = len(tracked_objects)
+                total_unique = context.total_unique
 
-                if self.use_cuda:
-                    # Re-upload to GPU if needed
-                    gpu_annotated = cv2.cuda_GpuMat()
-                    gpu_annotated.upload(annotated_frame)
-                    annotated_frame = gpu_annotated
+            if not annotate:
+                return frame, current_count, total_unique
 
-            # Get counts
-            with self.lock:
-                current_count = len(tracked_objects)
-                total_unique = len(self.unique_ids)
-
-            # Draw counts (on CPU)
-            if self.use_cuda:
-                annotated_frame = annotated_frame.download()
-
-            cv2.putText(
-                annotated_frame,
-                f'Current Count: {current_count}',
-                (20, 40),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                1,
-                (0, 255, 0),
-                2
+            # Draw annotations on CPU, on a reused buffer
+            annotated_frame = self.annotator.draw(
+                context.canvas(frame), tracked_objects, current_count, total_unique
             )
-            cv2.putText(
-                annotated_frame,
-                f'Total Unique: {total_unique}',
-                (20, 80),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                1,
-                (0, 255, 0),
-                2
-            )
-
-            # Save count to database
-            current_time = datetime.now()
-            if current_time.minute % 5 == 0 and current_time.second == 0:
-                try:
-                    camera = Camera.objects.get(id=camera_id)
-                    PersonCount.objects.create(
-                        camera=camera,
-                        count=current_count,
-                        total_count=total_unique,
-                        timestamp=current_time
-                    )
-                except Exception as e:
-                    logger.error(f"Error saving to database: {e}")
 
             return annotated_frame, current_count, total_unique
 
@@ -262,8 +316,51 @@ class PersonCounter:
 class StreamManager:
     def __init__(self):
         self.streams = {}
-        self.counter = PersonCounter()
-        self.lock = threading.Lock()
+        self.broadcasters = {}
+        self.results = ResultStore()
+        # Per-camera detection stride overrides, keyed by stream URL
+        self.detection_strides = getattr(settings, 'COUNTER_DETECTION_STRIDES', {})
+        # JPEG renditions viewers can pick from
+        self.encode_tiers = getattr(settings, 'COUNTER_ENCODE_TIERS', None) or {'full': {}}
+        self.default_tier = getattr(settings, 'COUNTER_DEFAULT_TIER', 'full')
+        # The model, the batching scheduler and the count writer are built
+        # by the first subscription, so importing the views (URL checks,
+        # management commands) loads no model and starts no threads
+        self.counter = None
+        self.scheduler = None
+        self.writer = None
+        self.lock = threading.RLock()
+
+    def start(self):
+        """
+        Load the model and start the scheduler and the count writer, once.
+        Returns False if the model cannot be loaded; nothing is started then
+        and the next subscription tries again.
+        """
+        with self.lock:
+            if self.counter is not None:
+                return True
+            try:
+                counter = PersonCounter()
+            except Exception as e:
+                logger.error(f"Error loading the person counter: {e}")
+                return False
+            self.scheduler = InferenceScheduler(
+                counter.detect_batch,
+                max_batch_size=getattr(settings, 'COUNTER_BATCH_SIZE', 8),
+                max_wait=getattr(settings, 'COUNTER_BATCH_WAIT', 0.01)
+            )
+            # Counts are saved by a background writer, off the frame path
+            self.writer = CountWriter(
+                interval=getattr(settings, 'COUNTER_PERSIST_INTERVAL', 300.0),
+                max_queue=getattr(settings, 'COUNTER_PERSIST_QUEUE', 1000),
+                batch_size=getattr(settings, 'COUNTER_PERSIST_BATCH', 100),
+                flush_interval=getattr(settings, 'COUNTER_PERSIST_FLUSH', 5.0),
+                rollup_interval=getattr(settings, 'COUNTER_ROLLUP_INTERVAL', 60.0)
+            )
+            self.counter = counter
+            atexit.register(self.close)
+            return True
 
     def get_stream(self, camera_id, stream_url):
         with self.lock:
@@ -276,37 +373,122 @@ class StreamManager:
                     return None
             return self.streams[camera_id]
 
-    def release_stream(self, camera_id):
+    def probe(self, camera_id, stream_url):
+        """
+        Whether a stream can be opened. A camera with a running pipeline is
+        online; otherwise the stream is opened without a capture thread and
+        released right away, so probing never leaves a decoder running.
+        """
         with self.lock:
             if camera_id in self.streams:
-                try:
-                    self.streams[camera_id].release()
-                    del self.streams[camera_id]
-                except Exception as e:
-                    logger.error(f"Error releasing stream for camera {camera_id}: {e}")
+                return True
+        try:
+            VideoStream(stream_url, threaded=False).release()
+            return True
+        except Exception as e:
+            logger.error(f"Error probing stream for camera {camera_id}: {e}")
+            return False
 
-    def get_frame(self, camera_id, stream_url):
-        stream = self.get_stream(camera_id, stream_url)
-        if stream is None:
-            return None, 0, 0
+    def release_stream(self, camera_id):
+        with self.lock:
+            broadcaster = self.broadcasters.pop(camera_id, None)
+            stream = self.streams.pop(camera_id, None)
+        self._shutdown(camera_id, broadcaster, stream)
 
+    def _shutdown(self, camera_id, broadcaster, stream):
         try:
-            ret, frame = stream.read()
-            if not ret:
-                self.release_stream(camera_id)
-                return None, 0, 0
+            if broadcaster is not None:
+                broadcaster.stop()
+            if stream is not None:
+                stream.release()
+            # Its last result is no longer current
+            self.results.discard(camera_id)
+            if self.counter is not None:
+                self.counter.release_context(camera_id)
+            if self.scheduler is not None:
+                self.scheduler.unregister(camera_id)
+            if self.writer is not None:
+                # A restarted camera starts over with a new tracker; sample
+                # it right away rather than at the next interval
+                self.writer.forget(camera_id)
+        except Exception as e:
+            logger.error(f"Error releasing stream for camera {camera_id}: {e}")
 
-            processed_frame, current_count, total_count = self.counter.process_frame(frame, camera_id)
-            
-            if processed_frame is not None:
-                try:
-                    _, buffer = cv2.imencode('.jpg', processed_frame)
-                    return buffer.tobytes(), current_count, total_count
-                except Exception as e:
-                    logger.error(f"Error encoding frame: {e}")
-            
-            return None, 0, 0
-            
+    def close(self):
+        """
+        Stop every pipeline and the scheduler, and write the samples still
+        queued. Registered with atexit once the pipeline starts, as the
+        writer runs in a daemon thread that would otherwise die with its
+        queue at exit.
+        """
+        with self.lock:
+            broadcasters, self.broadcasters = self.broadcasters, {}
+            streams, self.streams = self.streams, {}
+        for camera_id in broadcasters.keys() | streams.keys():
+            self._shutdown(camera_id, broadcasters.get(camera_id), streams.get(camera_id))
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        if self.writer is not None:
+            self.writer.stop()
+
+    def get_roi(self, stream_url):
+        """Region of interest configured on the Camera with this stream URL."""
+        try:
+            polygon = Camera.objects.filter(
+                stream_url=stream_url, roi__isnull=False
+            ).values_list('roi', flat=True).first()
+            return RegionOfInterest(polygon) if polygon else None
         except Exception as e:
-            logger.error(f"Error in get_frame: {e}")
-            return None, 0, 0
\ No newline at end of file
+            logger.error(f"Error loading ROI for {stream_url}: {e}")
+            return None
+
+    def subscribe(self, camera_id, stream_url, channel=ANNOTATED, tier=None):
+        """
+        Attach a viewer to one channel and encode tier of the camera's
+        shared pipeline, starting it on the first subscription. Returns None
+        if the model cannot be loaded or the stream cannot be opened.
+        """
+        with self.lock:
+            if not self.start():
+                return None
+            stream = self.get_stream(camera_id, stream_url)
+            if stream is None:
+                return None
+            self.counter.get_context(
+                camera_id,
+                detection_stride=self.detection_strides.get(stream_url),
+                roi=self.get_roi(stream_url)
+            )
+            broadcaster = self.broadcasters.get(camera_id)
+            if broadcaster is None or not broadcaster.is_running:
+                broadcaster = FrameBroadcaster(
+                    camera_id, stream, self.counter,
+                    results=self.results, scheduler=self.scheduler, writer=self.writer,
+                    on_idle=self._on_idle,
+                    tiers=self.encode_tiers, default_tier=self.default_tier
+                ).start()
+                self.broadcasters[camera_id] = broadcaster
+            return broadcaster.subscribe(channel, tier)
+
+    def _on_idle(self, broadcaster):
+        # Last viewer left: stop the pipeline unless someone re-subscribed
+        camera_id = broadcaster.camera_id
+        with self.lock:
+            if self.broadcasters.get(camera_id) is not broadcaster or broadcaster.subscribers:
+                return
+            del self.broadcasters[camera_id]
+            stream = self.streams.pop(camera_id, None)
+        self._shutdown(camera_id, broadcaster, stream)
+
+    def stats(self):
+        """Snapshot of pipeline health for the pipeline-stats endpoint."""
+        with self.lock:
+            broadcasters = dict(self.broadcasters)
+        return {
+            'scheduler': self.scheduler.stats() if self.scheduler is not None else None,
+            'persistence': self.writer.stats() if self.writer is not None else None,
+            'cameras': {
+                camera_id: broadcaster.stats()
+                for camera_id, broadcaster in broadcasters.items()
+            },
+        }
@@ -0,0 +1,278 @@
+# counter/utils/detectors.py
+import os
+import cv2
+import numpy as np
+import time
+import logging
+import contextlib
+import torch
+from ultralytics import YOLO
+from django.conf import settings
+from sort.sort import iou_batch, linear_assignment
+
+logger = logging.getLogger(__name__)
+
+PERSON_CLASS_ID = 0
+
+class Detector:
+    """
+    Common interface of the detector backends. detect_batch() takes a list
+    of BGR frames and returns the person detections of each frame as rows of
+    [x1, y1, x2, y2, conf] in frame pixel coordinates.
+    """
+    name = None
+
+    def detect_batch(self, frames):
+        raise NotImplementedError
+
+    def warmup(self, batch_size=1, shape=(720, 1280, 3)):
+        """
+        Run a dummy batch so that model setup, kernel selection and memory
+        allocation happen at startup instead of on a camera's first frame.
+        """
+        start = time.perf_counter()
+        self.detect_batch([np.zeros(shape, dtype=np.uint8)] * batch_size)
+        logger.info(f"{self.name} detector warmed up in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+class TorchDetector(Detector):
+    """
+    Runs the ultralytics YOLO model on PyTorch. Mixed precision is only used
+    on CUDA; on CPU autocast buys nothing. ``channels_last`` and ``compile``
+    are passed to the ultralytics predictor, which needs a release that
+    supports them.
+    """
+    name = 'torch'
+
+    def __init__(self, weights='yolov8n.pt', device=None, conf=0.25, iou=0.7, max_det=100,
+                 channels_last=False, compile=False):
+        # Check for GPU availability
+        self.device = device or torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        self.use_cuda = torch.device(self.device).type == 'cuda'
+        # Filtering and limits go to the predictor so that NMS only ever
+        # sees person boxes; attributes set on the model are not read by it
+        self.predict_args = {
+            'verbose': False,
+            'classes': [PERSON_CLASS_ID],
+            'conf': conf,
+            'iou': iou,
+            'max_det': max_det,
+        }
+        if channels_last:
+            self.predict_args['channels_last'] = True
+        if compile:
+            self.predict_args['compile'] = compile
+
+        # Initialize YOLO model with GPU support
+        self.model = YOLO(weights)
+        self.model.to(self.device)  # Move model to GPU
+
+    def detect_batch(self, frames):
+        # Enable automatic mixed precision on GPU only
+        autocast = torch.autocast('cuda') if self.use_cuda else contextlib.nullcontext()
+        with torch.inference_mode(), autocast:
+            results = self.model(list(frames), **self.predict_args)
+        return self.to_arrays(results)
+
+    @staticmethod
+    def to_arrays(results):
+        """Turn each result's person boxes into one (N, 5) float32 array."""
+        return [result.boxes.data[:, :5].float().cpu().numpy() for result in results]
+
+def letterbox(frame, size, stride=None):
+    """
+    Resize ``frame`` to fit a ``size`` x ``size`` square, keeping the aspect
+    ratio and padding the borders with grey as ultralytics does. With
+    ``stride`` the padding only rounds each side up to a multiple of it
+    (rectangular inference). Returns the padded image, the scale and the
+    (left, top) padding.
+    """
+    h, w = frame.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    if (new_w, new_h) != (w, h):
+        frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    dw, dh = size - new_w, size - new_h
+    if stride:
+        dw, dh = dw % stride, dh % stride
+    dw, dh = dw / 2, dh / 2
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    padded = cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return padded, scale, (left, top)
+
+def preprocess(frames, size, stride=None):
+    """
+    Letterbox a list of BGR frames into one NCHW float32 RGB batch. Frames
+    of different sizes are always padded to the full square.
+    """
+    if stride and len({frame.shape for frame in frames}) > 1:
+        stride = None
+    images, transforms = [], []
+    for frame in frames:
+        image, scale, pad = letterbox(frame, size, stride)
+        images.append(image)
+        transforms.append((scale, pad, frame.shape[:2]))
+    batch = np.stack(images)[..., ::-1].transpose(0, 3, 1, 2)
+    return np.ascontiguousarray(batch, dtype=np.float32) / 255.0, transforms
+
+class OnnxDetector(Detector):
+    """
+    Runs a YOLOv8 model exported to ONNX (FP32 or INT8, see the
+    export_detector command) on ONNX Runtime. Only the person class is
+    decoded, so NMS never sees the other 79 classes.
+    """
+    name = 'onnx'
+
+    def __init__(self, model_path='yolov8n.onnx', conf=0.25, iou=0.7, max_det=100,
+                 imgsz=640, providers=None, threads=0):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("The 'onnx' detector backend requires the onnxruntime package")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            model_path, sess_options=options,
+            providers=providers or ['CPUExecutionProvider']
+        )
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Models exported with a fixed input size dictate it; dynamic ones
+        # get rectangular inputs like ultralytics feeds its PyTorch models
+        self.dynamic = not isinstance(model_input.shape[2], int)
+        self.imgsz = imgsz if self.dynamic else model_input.shape[2]
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+        logger.info(f"ONNX Runtime detector {model_path} on {self.session.get_providers()}")
+
+    def detect_batch(self, frames):
+        if len(frames) == 0:
+            return []
+        batch, transforms = preprocess(frames, self.imgsz, stride=32 if self.dynamic else None)
+        # (batch, 4 + classes, anchors): cx, cy, w, h then per-class scores
+        output = self.session.run(None, {self.input_name: batch})[0]
+        return [self._postprocess(prediction, transform)
+                for prediction, transform in zip(output, transforms)]
+
+    def _postprocess(self, prediction, transform):
+        scores = prediction[4 + PERSON_CLASS_ID]
+        keep = scores > self.conf
+        if not keep.any():
+            return np.empty((0, 5), dtype=np.float32)
+        cx, cy, w, h = prediction[:4, keep]
+        scores = scores[keep]
+
+        boxes = np.stack((cx - w / 2, cy - h / 2, w, h), axis=1)
+        # top_k would cap the candidates before NMS, so max_det is applied after
+        indices = cv2.dnn.NMSBoxes(boxes.tolist(), scores.tolist(), self.conf, self.iou)
+        indices = np.asarray(indices, dtype=int).reshape(-1)[:self.max_det]
+
+        # Undo the letterbox: back to frame pixels, clipped to the frame
+        scale, (left, top), (frame_h, frame_w) = transform
+        detections = np.empty((len(indices), 5), dtype=np.float32)
+        detections[:, 0] = (boxes[indices, 0] - left) / scale
+        detections[:, 1] = (boxes[indices, 1] - top) / scale
+        detections[:, 2] = detections[:, 0] + boxes[indices, 2] / scale
+        detections[:, 3] = detections[:, 1] + boxes[indices, 3] / scale
+        detections[:, 4] = scores[indices]
+        np.clip(detections[:, 0:4:2], 0, frame_w, out=detections[:, 0:4:2])
+        np.clip(detections[:, 1:4:2], 0, frame_h, out=detections[:, 1:4:2])
+        return detections
+
+# Selectable with the COUNTER_DETECTOR_BACKEND setting
+DETECTOR_BACKENDS = {
+    'torch': TorchDetector,
+    'onnx': OnnxDetector,
+}
+
+def build_detector(backend='torch', **options):
+    try:
+        detector_class = DETECTOR_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown detector backend {backend!r}, expected one of {sorted(DETECTOR_BACKENDS)}")
+    return detector_class(**options)
+
+def as_array(detections):
+    if len(detections) == 0:
+        return np.empty((0, 5), dtype=np.float32)
+    return np.asarray(detections, dtype=np.float32).reshape(-1, 5)
+
+def compare_detectors(reference, candidate, frames, match_iou=0.5):
+    """
+    Run two detectors over the same frames and pair up their detections by
+    IOU. Returns the reference and candidate detection counts, the recall
+    and precision of the candidate, and the mean IOU and mean confidence
+    difference of the matched pairs.
+    """
+    expected = found = matched = 0
+    ious, conf_deltas = [], []
+    for frame in frames:
+        ref = as_array(reference.detect_batch([frame])[0])
+        cand = as_array(candidate.detect_batch([frame])[0])
+        expected += len(ref)
+        found += len(cand)
+        if len(ref) == 0 or len(cand) == 0:
+            continue
+        iou = iou_batch(ref, cand)
+        pairs = linear_assignment(-iou)
+        pairs = pairs[iou[pairs[:, 0], pairs[:, 1]] >= match_iou]
+        matched += len(pairs)
+        ious.extend(iou[pairs[:, 0], pairs[:, 1]])
+        conf_deltas.extend(np.abs(ref[pairs[:, 0], 4] - cand[pairs[:, 1], 4]))
+
+    return {
+        'expected': expected,
+        'found': found,
+        'recall': matched / expected if expected else 1.0,
+        'precision': matched / found if found else 1.0,
+        'mean_iou': float(np.mean(ious)) if ious else 1.0,
+        'conf_delta': float(np.mean(conf_deltas)) if conf_deltas else 0.0,
+    }
+
+def cpu_threads():
+    """
+    Intra-op threads per worker process: COUNTER_CPU_THREADS if set,
+    otherwise the cores divided evenly between COUNTER_WORKER_PROCESSES.
+    """
+    threads = getattr(settings, 'COUNTER_CPU_THREADS', 0)
+    if threads:
+        return threads
+    workers = max(1, getattr(settings, 'COUNTER_WORKER_PROCESSES', 1))
+    return max(1, (os.cpu_count() or 1) // workers)
+
+def configure_torch_threads(threads, interop_threads=None):
+    torch.set_num_threads(threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            # Only allowed before the first parallel operation
+            logger.error(f"Error setting inter-op threads: {e}")
+
+def detector_from_settings(backend=None, device=None):
+    """Build the detector configured by the COUNTER_DETECTOR_* settings."""
+    backend = backend or getattr(settings, 'COUNTER_DETECTOR_BACKEND', 'torch')
+    options = {
+        'conf': getattr(settings, 'COUNTER_DETECTOR_CONF', 0.25),
+        'iou': getattr(settings, 'COUNTER_DETECTOR_IOU', 0.7),
+        'max_det': getattr(settings, 'COUNTER_DETECTOR_MAX_DET', 100),
+    }
+    if backend == 'onnx':
+        options.update(
+            model_path=getattr(settings, 'COUNTER_ONNX_MODEL', 'yolov8n.onnx'),
+            providers=getattr(settings, 'COUNTER_ONNX_PROVIDERS', None),
+            threads=cpu_threads(),
+        )
+    elif backend == 'torch':
+        configure_torch_threads(cpu_threads(), getattr(settings, 'COUNTER_INTEROP_THREADS', 1))
+        options.update(
+            weights=getattr(settings, 'COUNTER_DETECTOR_WEIGHTS', 'yolov8n.pt'),
+            device=device,
+            channels_last=getattr(settings, 'COUNTER_TORCH_CHANNELS_LAST', False),
+            compile=getattr(settings, 'COUNTER_TORCH_COMPILE', False),
+        )
+    return build_detector(backend, **options)
@@ -0,0 +1,57 @@
+# counter/utils/encoding.py
+import cv2
+import time
+
+class EncodeTier:
+    """
+    One JPEG rendition of a camera's frames: scaled down to ``height``
+    (never up), encoded at ``quality`` and produced at most ``max_fps``
+    times a second. A tier is only encoded while it has subscribers.
+    """
+    def __init__(self, name, height=None, quality=80, max_fps=None):
+        self.name = name
+        self.height = height
+        self.quality = quality
+        self.max_fps = max_fps
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+        self.last_encoded = 0.0
+        self.frames_encoded = 0
+        self.avg_encode_ms = 0.0
+        self.avg_bytes = 0.0
+
+    def due(self, now=None):
+        """True if the frame rate cap allows encoding another frame."""
+        if not self.max_fps:
+            return True
+        now = now or time.monotonic()
+        return now - self.last_encoded >= 1.0 / self.max_fps
+
+    def encode(self, frame):
+        """Return the JPEG bytes of ``frame`` for this tier or None."""
+        start = time.perf_counter()
+        h, w = frame.shape[:2]
+        if self.height and h > self.height:
+            size = (int(round(w * self.height / h)), self.height)
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        ret, buffer = cv2.imencode('.jpg', frame, self.params)
+        if not ret:
+            return None
+        data = buffer.tobytes()
+
+        self.last_encoded = time.monotonic()
+        self.frames_encoded += 1
+        # Exponential moving averages, as for the inference batches
+        alpha = 0.05 if self.frames_encoded > 1 else 1.0
+        self.avg_encode_ms += alpha * ((time.perf_counter() - start) * 1000 - self.avg_encode_ms)
+        self.avg_bytes += alpha * (len(data) - self.avg_bytes)
+        return data
+
+    def stats(self):
+        return {
+            'frames_encoded': self.frames_encoded,
+            'avg_encode_ms': round(self.avg_encode_ms, 2),
+            'avg_kb': round(self.avg_bytes / 1024, 1),
+            'height': self.height,
+            'quality': self.quality,
+            'max_fps': self.max_fps,
+        }
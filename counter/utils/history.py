@@ -0,0 +1,87 @@
+# counter/utils/history.py
+import math
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+from django.db.models import Avg, Count, Func, IntegerField, Max, Min, Value
+from ..models import PersonCount
+
+# Upper bound on the points of one response
+MAX_POINTS = 1000
+
+class EpochSeconds(Func):
+    """Whole seconds since the Unix epoch of a datetime column."""
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="CAST(strftime('%%%%s', %(expressions)s) AS INTEGER)",
+                           **extra_context)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="CAST(FLOOR(EXTRACT(EPOCH FROM %(expressions)s)) AS INTEGER)",
+                           **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="UNIX_TIMESTAMP(%(expressions)s) DIV 1", **extra_context)
+
+def bucket_width(start, end, points, resolution=None):
+    """Seconds per bucket: ``resolution`` if given, else the range split into ``points``."""
+    if resolution:
+        return max(1, int(resolution))
+    return max(1, math.ceil((end - start) / max(1, points)))
+
+def page_bounds(start, end, width, limit, cursor=None):
+    """
+    The epoch range of one page: at most ``limit`` buckets aligned to
+    ``width`` from ``cursor`` (or ``start``), and the cursor of the next
+    page or None.
+    """
+    page_start = (int(cursor if cursor is not None else start) // width) * width
+    page_end = min(end, page_start + limit * width)
+    return page_start, page_end, page_end if page_end < end else None
+
+def _buckets(camera_ids, page_start, page_end, width):
+    # The range filter on camera and timestamp is served by the composite
+    # index; grouping happens in the database
+    return (
+        PersonCount.objects
+        .filter(
+            camera_id__in=camera_ids,
+            timestamp__gte=datetime.fromtimestamp(page_start, tz=dt_timezone.utc),
+            timestamp__lt=datetime.fromtimestamp(page_end, tz=dt_timezone.utc),
+        )
+        .order_by()
+        .annotate(bucket=EpochSeconds('timestamp') / Value(width))
+        .values('bucket', 'camera_id')
+        .annotate(
+            low=Min('count'), high=Max('count'), mean=Avg('count'),
+            max_total=Max('total_count'), samples=Count('id')
+        )
+    )
+
+def count_series(camera_ids, start, end, width, limit=MAX_POINTS, cursor=None):
+    """
+    Downsampled count history of one or more cameras between the epoch
+    seconds ``start`` and ``end``: per bucket of ``width`` seconds the min,
+    max and average of the count and the highest running total (the
+    latest one unless a tracker restarted within the bucket). With several
+    cameras each value is summed across them, so min and max bound the
+    combined count. Returns (points, next_cursor); follow next_cursor for
+    the rest of the range.
+    """
+    page_start, page_end, next_cursor = page_bounds(start, end, width, min(limit, MAX_POINTS), cursor)
+    merged = defaultdict(lambda: {'min': 0, 'max': 0, 'avg': 0.0, 'max_total': 0, 'samples': 0})
+    for row in _buckets(camera_ids, page_start, page_end, width):
+        point = merged[row['bucket']]
+        point['min'] += row['low']
+        point['max'] += row['high']
+        point['avg'] += row['mean']
+        point['max_total'] += row['max_total']
+        point['samples'] += row['samples']
+
+    points = []
+    for bucket in sorted(merged):
+        point = merged[bucket]
+        point['avg'] = round(point['avg'], 2)
+        point['time'] = datetime.fromtimestamp(bucket * width, tz=dt_timezone.utc).isoformat()
+        points.append(point)
+    return points, next_cursor
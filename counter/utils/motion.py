@@ -0,0 +1,70 @@
+# counter/utils/motion.py
+import cv2
+import time
+
+class MotionGate:
+    """
+    Cheap scene-change check in front of the detector.
+
+    Each frame is shrunk to a small blurred grayscale thumbnail and compared
+    with the thumbnail of the frame the detector last ran on. If fewer than
+    ``min_changed`` of its pixels moved by more than ``pixel_threshold``
+    grey levels, the scene is considered unchanged and the previous
+    detections are reused. Comparing against the last inferred frame rather
+    than the previous one means slow movement still accumulates into a
+    change. Inference is forced at least every ``refresh_interval`` seconds.
+    """
+    def __init__(self, width=160, pixel_threshold=25, min_changed=0.002, refresh_interval=5.0):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_changed = min_changed
+        self.refresh_interval = refresh_interval
+        self.reference = None
+        self.detections = None
+        self.last_inference = 0.0
+        self.last_changed = 0.0
+        self.frames_checked = 0
+        self.frames_gated = 0
+
+    def _thumbnail(self, frame):
+        h, w = frame.shape[:2]
+        height = max(1, int(h * self.width / w))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def check(self, frame, now=None):
+        """
+        Return True if the detector has to run on ``frame``; False if the
+        detections from the last inference can be reused.
+        """
+        now = now or time.monotonic()
+        self.frames_checked += 1
+        thumbnail = self._thumbnail(frame)
+
+        if (self.reference is not None and self.detections is not None
+                and self.reference.shape == thumbnail.shape
+                and now - self.last_inference < self.refresh_interval):
+            diff = cv2.absdiff(thumbnail, self.reference)
+            changed = cv2.countNonZero(cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)[1])
+            self.last_changed = changed / diff.size
+            if self.last_changed < self.min_changed:
+                self.frames_gated += 1
+                return False
+
+        self.reference = thumbnail
+        self.last_inference = now
+        return True
+
+    def record(self, detections):
+        """Remember the detections of the frame that was just inferred."""
+        self.detections = detections
+
+    def stats(self):
+        return {
+            'motion_frames_checked': self.frames_checked,
+            'motion_frames_gated': self.frames_gated,
+            'motion_gated_ratio': round(self.frames_gated / self.frames_checked, 3) if self.frames_checked else 0.0,
+            'motion_last_changed': round(self.last_changed, 4),
+        }
@@ -0,0 +1,187 @@
+# counter/utils/persistence.py
+import queue
+import threading
+import time
+import logging
+from datetime import datetime, timezone as dt_timezone
+from django.db import connection, transaction
+from ..models import Camera, PersonCount
+from .rollups import RollupEngine
+
+logger = logging.getLogger(__name__)
+
+class CountWriter:
+    """
+    Write-behind persistence of the person counts.
+
+    Pipelines call record() for every processed frame; it only keeps one
+    sample per camera every ``interval`` seconds (aligned to the wall
+    clock) and puts it on a bounded queue without blocking. A background
+    thread turns the queue into PersonCount rows with bulk_create(), in
+    batches of up to ``batch_size`` or every ``flush_interval`` seconds.
+    Samples that do not fit in the queue are dropped and counted, so a slow
+    database never stalls frame processing.
+
+    Cameras are matched by stream URL; lookups are cached for
+    ``lookup_ttl`` seconds, including misses. Samples of streams without a
+    Camera row are discarded. Written samples are also folded into the
+    hourly and daily rollups, which are saved every ``rollup_interval``
+    seconds.
+    """
+    def __init__(self, interval=300.0, max_queue=1000, batch_size=100, flush_interval=5.0,
+                 lookup_ttl=300.0, rollup_interval=60.0):
+        self.interval = interval
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self.lookup_ttl = lookup_ttl
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._next_sample = {}
+        self._cameras = {}
+        self._stopped = threading.Event()
+        self.rollups = RollupEngine(interval=interval)
+        self.rollup_interval = rollup_interval
+        self._last_rollup = time.monotonic()
+
+        self.samples_queued = 0
+        self.samples_dropped = 0
+        self.samples_written = 0
+        self.samples_unmapped = 0
+        self.batches = 0
+        self.write_errors = 0
+        self.last_flush_ms = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="count-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, camera_id, stream_url, count, total, timestamp=None):
+        """Queue a sample if the camera's interval has elapsed. Never blocks."""
+        timestamp = timestamp or time.time()
+        if timestamp < self._next_sample.get(camera_id, 0.0):
+            return False
+        self._next_sample[camera_id] = (timestamp // self.interval + 1) * self.interval
+        try:
+            self._queue.put_nowait((stream_url, count, total, timestamp))
+        except queue.Full:
+            self.samples_dropped += 1
+            return False
+        self.samples_queued += 1
+        return True
+
+    def forget(self, camera_id):
+        """Sample a camera right away the next time it is recorded."""
+        self._next_sample.pop(camera_id, None)
+
+    def _camera(self, stream_url):
+        """(camera id, branch id) of a stream URL, or None."""
+        now = time.monotonic()
+        cached = self._cameras.get(stream_url)
+        if cached is not None and now - cached[1] < self.lookup_ttl:
+            return cached[0]
+        camera = Camera.objects.filter(stream_url=stream_url).values_list('id', 'branch_id').first()
+        self._cameras[stream_url] = (camera, now)
+        return camera
+
+    def _next_batch(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and not self._stopped.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.5)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _check_connection(self):
+        # The writer thread keeps one connection for its whole life instead
+        # of following CONN_MAX_AGE, which is meant for request threads; only
+        # a connection that stopped working is replaced
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
+
+    def flush(self, batch):
+        start = time.perf_counter()
+        self._check_connection()
+        try:
+            rows, branches = [], []
+            for stream_url, count, total, timestamp in batch:
+                camera = self._camera(stream_url)
+                if camera is None:
+                    self.samples_unmapped += 1
+                    continue
+                rows.append(PersonCount(
+                    camera_id=camera[0],
+                    count=count,
+                    total_count=total,
+                    timestamp=datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+                ))
+                branches.append(camera[1])
+            if rows:
+                # One transaction per batch; the camera lookups above stay
+                # outside it so the write lock is held only for the insert
+                with transaction.atomic():
+                    PersonCount.objects.bulk_create(rows, batch_size=self.batch_size)
+                self.samples_written += len(rows)
+                self.batches += 1
+                for row, branch_id in zip(rows, branches):
+                    self.rollups.add(row.camera_id, branch_id, row.count, row.total_count, row.timestamp)
+        except Exception as e:
+            self.write_errors += 1
+            logger.error(f"Error saving counts to database: {e}")
+        self.last_flush_ms = (time.perf_counter() - start) * 1000
+
+    def flush_rollups(self):
+        self._last_rollup = time.monotonic()
+        self._check_connection()
+        try:
+            self.rollups.flush()
+        except Exception as e:
+            self.write_errors += 1
+            logger.error(f"Error saving rollups: {e}")
+
+    def _run(self):
+        while not self._stopped.is_set():
+            batch = self._next_batch()
+            if batch:
+                self.flush(batch)
+            if time.monotonic() - self._last_rollup >= self.rollup_interval:
+                self.flush_rollups()
+        # Write what is left on shutdown
+        while True:
+            batch = self._drain()
+            if not batch:
+                break
+            self.flush(batch)
+        self.flush_rollups()
+        connection.close()
+
+    def stop(self, timeout=5.0):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            'queue_depth': self._queue.qsize(),
+            'max_queue': self._queue.maxsize,
+            'interval': self.interval,
+            'samples_queued': self.samples_queued,
+            'samples_written': self.samples_written,
+            'samples_dropped': self.samples_dropped,
+            'samples_unmapped': self.samples_unmapped,
+            'batches': self.batches,
+            'write_errors': self.write_errors,
+            'last_flush_ms': round(self.last_flush_ms, 1),
+            'rollups': self.rollups.stats(),
+        }
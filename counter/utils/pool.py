@@ -0,0 +1,91 @@
+# counter/utils/pool.py
+import threading
+import numpy as np
+
+class PooledFrame:
+    """
+    A frame buffer on loan from a FramePool. Every holder calls retain()
+    before using it and release() when done; the buffer goes back to the
+    pool when the last holder lets go, so it must not be used after that.
+    """
+    def __init__(self, pool, array):
+        self.pool = pool
+        self.array = array
+        self._refs = 1
+
+    def retain(self):
+        with self.pool.lock:
+            self._refs += 1
+        return self
+
+    def release(self):
+        with self.pool.lock:
+            self._refs -= 1
+            if self._refs > 0:
+                return
+        self.pool.recycle(self.array)
+        self.array = None
+
+class FramePool:
+    """
+    Per-camera free list of preallocated frame buffers. Buffers are reused
+    as long as the resolution does not change, so steady-state decoding and
+    annotation allocate nothing. Also keeps count of the frame bytes copied
+    into its buffers.
+    """
+    def __init__(self, max_free=4):
+        self.max_free = max_free
+        self.lock = threading.Lock()
+        self._free = []
+        self.allocated = 0
+        self.reused = 0
+        self.copies = 0
+        self.bytes_copied = 0
+
+    def acquire(self, shape=None, dtype=np.uint8):
+        """
+        Return a free buffer, or a new one of ``shape`` if none is free. With
+        no shape, None is returned when the pool is empty.
+        """
+        with self.lock:
+            while self._free:
+                array = self._free.pop()
+                if shape is None or (array.shape == tuple(shape) and array.dtype == dtype):
+                    self.reused += 1
+                    return array
+        if shape is None:
+            return None
+        self.allocated += 1
+        return np.empty(shape, dtype=dtype)
+
+    def recycle(self, array):
+        if array is None:
+            return
+        with self.lock:
+            # Buffers of an old resolution are dropped along the way in acquire()
+            if len(self._free) < self.max_free:
+                self._free.append(array)
+
+    def wrap(self, array):
+        """Hand out ``array`` as a pooled frame with one reference."""
+        return PooledFrame(self, array)
+
+    def record_copy(self, nbytes):
+        self.copies += 1
+        self.bytes_copied += nbytes
+
+    def copy(self, frame):
+        """Copy ``frame`` into a pooled buffer."""
+        array = self.acquire(frame.shape, frame.dtype)
+        np.copyto(array, frame)
+        self.record_copy(frame.nbytes)
+        return self.wrap(array)
+
+    def stats(self):
+        return {
+            'allocated': self.allocated,
+            'reused': self.reused,
+            'free': len(self._free),
+            'copies': self.copies,
+            'bytes_copied': self.bytes_copied,
+        }
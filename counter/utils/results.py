@@ -0,0 +1,113 @@
+# counter/utils/results.py
+import time
+import asyncio
+import threading
+from collections import namedtuple
+from .slot import FrameSlot
+
+CameraResult = namedtuple('CameraResult', ['count', 'total', 'frame_time', 'updated_at'])
+
+class ResultStore:
+    """
+    In-memory store of the latest pipeline result per camera.
+
+    Pipelines overwrite their entry once per processed frame and readers
+    (the stats endpoint) only ever do a lookup, so serving stats never
+    touches the decoder or the model. Each camera's results form a stream
+    with increasing sequence numbers that readers can wait on, from a thread
+    or a coroutine, for the next result.
+    """
+    def __init__(self):
+        self._slots = {}
+        self.lock = threading.Lock()
+
+    def _slot(self, camera_id):
+        slot = self._slots.get(camera_id)
+        if slot is None:
+            with self.lock:
+                slot = self._slots.setdefault(camera_id, FrameSlot())
+        return slot
+
+    def publish(self, camera_id, count, total, frame_time=None):
+        now = time.time()
+        return self._slot(camera_id).publish(CameraResult(count, total, frame_time or now, now), now)
+
+    def latest(self, camera_id):
+        """Return (seq, CameraResult) of the newest result or None."""
+        slot = self._slots.get(camera_id)
+        entry = slot.latest() if slot is not None else None
+        return (entry[0], entry[2]) if entry is not None else None
+
+    def get(self, camera_id):
+        latest = self.latest(camera_id)
+        return latest[1] if latest is not None else None
+
+    async def wait_newer_async(self, camera_id, seq, timeout=None):
+        """
+        Wait for a result newer than ``seq`` and return (seq, CameraResult),
+        or the newest one if none arrives within ``timeout``. Cameras that
+        never published return None right away; only pipelines create
+        entries, so client-supplied IDs cannot grow the store.
+        """
+        slot = self._slots.get(camera_id)
+        if slot is None:
+            return None
+        entry = await slot.wait_newer_async(seq, timeout)
+        return (entry[0], entry[2]) if entry is not None else self.latest(camera_id)
+
+    def discard(self, camera_id):
+        with self.lock:
+            slot = self._slots.pop(camera_id, None)
+        if slot is not None:
+            slot.close()
+
+class BranchFeed:
+    """
+    Change tracker for one push client following several cameras, keyed
+    by e.g. their camera number. changes() returns the cameras whose count
+    or total differ from what the client was last sent, and the cameras
+    whose pipeline stopped since, with ``'status': 'no_data'``.
+    """
+    def __init__(self, store, cameras):
+        self.store = store
+        self.cameras = cameras
+        self.sent = {}
+        self.seqs = dict.fromkeys(cameras.values(), 0)
+
+    def changes(self):
+        changes = {}
+        for key, camera_id in self.cameras.items():
+            latest = self.store.latest(camera_id)
+            if latest is None:
+                if self.sent.pop(key, None) is not None:
+                    self.seqs[camera_id] = 0
+                    changes[key] = {'count': 0, 'total': 0, 'frame_time': None, 'status': 'no_data'}
+                continue
+            self.seqs[camera_id], result = latest
+            values = (result.count, result.total)
+            if self.sent.get(key) != values:
+                self.sent[key] = values
+                changes[key] = {
+                    'count': result.count,
+                    'total': result.total,
+                    'frame_time': round(result.frame_time, 3),
+                }
+        return changes
+
+    async def wait_async(self, timeout=None):
+        """
+        Wait until any of the cameras publishes a result. Only cameras that
+        have published are waited on; with none of them running this
+        returns at once and the caller's poll interval applies.
+        """
+        waits = [
+            asyncio.ensure_future(self.store.wait_newer_async(camera_id, seq))
+            for camera_id, seq in self.seqs.items() if self.store.latest(camera_id) is not None
+        ]
+        if not waits:
+            return
+        try:
+            await asyncio.wait(waits, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for wait in waits:
+                wait.cancel()
@@ -0,0 +1,68 @@
+# counter/utils/roi.py
+import numpy as np
+
+class RegionOfInterest:
+    """
+    A camera's region of interest: a polygon in coordinates normalised to
+    the frame size (0..1), so it survives resolution changes.
+
+    The detector only sees the polygon's bounding crop; detections are mapped
+    back to frame coordinates and kept if their foot point (bottom centre of
+    the box) lies inside the polygon.
+    """
+    def __init__(self, polygon):
+        points = np.asarray(polygon, dtype=np.float64)
+        if points.ndim != 2 or points.shape[1] != 2 or len(points) < 3:
+            raise ValueError("ROI must be a list of at least three [x, y] points")
+        if points.min() < 0 or points.max() > 1:
+            raise ValueError("ROI points must be normalised to the 0..1 range")
+        self.polygon = points
+        self.frame_shape = None
+        self.bounds = None
+
+    def _fit(self, shape):
+        # Pixel polygon, crop bounds and edge slopes only change with the
+        # frame size, so they are computed once per resolution
+        if shape[:2] == self.frame_shape:
+            return
+        h, w = shape[:2]
+        points = self.polygon * (w, h)
+        x0, y0 = np.floor(points.min(axis=0)).astype(int)
+        x1, y1 = np.ceil(points.max(axis=0)).astype(int)
+        x0, y0 = min(max(int(x0), 0), w - 1), min(max(int(y0), 0), h - 1)
+        self.bounds = (x0, y0, max(min(int(x1), w), x0 + 1), max(min(int(y1), h), y0 + 1))
+
+        self._xi, self._yi = points[:, 0], points[:, 1]
+        xj, yj = np.roll(self._xi, -1), np.roll(self._yi, -1)
+        dy = yj - self._yi
+        # Horizontal edges never straddle a point, so their slope is unused
+        self._slope = np.divide(xj - self._xi, dy, out=np.zeros_like(dy), where=dy != 0)
+        self._yj = yj
+        self.frame_shape = shape[:2]
+
+    def crop(self, frame):
+        """Return the bounding crop of the ROI as a view into ``frame``."""
+        self._fit(frame.shape)
+        x0, y0, x1, y1 = self.bounds
+        return frame[y0:y1, x0:x1]
+
+    def contains(self, x, y):
+        """Even-odd point-in-polygon test for arrays of pixel coordinates."""
+        x = np.asarray(x, dtype=np.float64)[:, None]
+        y = np.asarray(y, dtype=np.float64)[:, None]
+        straddles = (self._yi > y) != (self._yj > y)
+        crossing = self._xi + (y - self._yi) * self._slope
+        return np.count_nonzero(straddles & (x < crossing), axis=1) % 2 == 1
+
+    def filter(self, detections):
+        """
+        Map detections made on the crop back to frame coordinates and drop
+        the ones outside the polygon. Must follow crop() on the same frame.
+        """
+        if len(detections) == 0:
+            return np.empty((0, 5), dtype=np.float32)
+        dets = np.array(detections, dtype=np.float32).reshape(-1, 5)
+        x0, y0 = self.bounds[:2]
+        dets[:, [0, 2]] += x0
+        dets[:, [1, 3]] += y0
+        return dets[self.contains((dets[:, 0] + dets[:, 2]) / 2, dets[:, 3])]
@@ -0,0 +1,149 @@
+# counter/utils/rollups.py
+import threading
+import logging
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.utils import timezone
+from ..models import HourlyStats, DailyStats
+
+logger = logging.getLogger(__name__)
+
+HOURLY_FIELDS = ['samples', 'minutes', 'total_count', 'peak_count', 'unique_visitors']
+DAILY_FIELDS = ['total_count', 'peak_hour', 'peak_count', 'unique_visitors']
+
+def hour_start(timestamp):
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+class HourBucket:
+    """Running aggregates of one branch for one hour."""
+    def __init__(self, samples=0, minutes=0.0, total_count=0.0, peak_count=0, unique_visitors=0):
+        self.samples = samples
+        self.minutes = minutes
+        self.total_count = total_count
+        self.peak_count = peak_count
+        self.unique_visitors = unique_visitors
+        # Latest count of each camera, summed into the branch occupancy
+        self.latest = {}
+
+    def add(self, camera_id, count, visitors, minutes):
+        self.samples += 1
+        self.minutes += minutes
+        self.total_count += count * minutes
+        self.unique_visitors += visitors
+        self.latest[camera_id] = count
+        self.peak_count = max(self.peak_count, sum(self.latest.values()))
+
+class RollupEngine:
+    """
+    Incremental per-branch hourly and daily aggregation of PersonCount
+    samples.
+
+    add() folds a sample into its branch's in-memory hour bucket: the
+    number of samples and the camera-minutes they cover (``interval``
+    seconds each, the writer's sampling interval), the person-minutes
+    (each count times its minutes), the peak branch occupancy
+    (the latest counts of its cameras added up) and the new unique visitors
+    (the growth of each camera's running total; a drop means the tracker
+    restarted). flush() upserts the changed HourlyStats rows and recomputes
+    the DailyStats of their days from the hourly rows, so the raw samples
+    are never scanned again. Buckets are seeded from existing rows when
+    first touched, so a restart carries on instead of overwriting them.
+    """
+    def __init__(self, interval=300.0, seed=True, keep_hours=2):
+        self.minutes = interval / 60
+        self.seed = seed
+        self.keep_hours = keep_hours
+        self.buckets = {}
+        self.dirty = set()
+        self.last_totals = {}
+        self.lock = threading.Lock()
+        self.samples = 0
+        self.flushes = 0
+
+    def _bucket(self, branch_id, hour):
+        key = (branch_id, hour)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            row = None
+            if self.seed:
+                row = HourlyStats.objects.filter(branch_id=branch_id, hour=hour).values(*HOURLY_FIELDS).first()
+            bucket = self.buckets[key] = HourBucket(**(row or {}))
+        return bucket
+
+    def add(self, camera_id, branch_id, count, total, timestamp):
+        with self.lock:
+            previous = self.last_totals.get(camera_id)
+            visitors = total - previous if previous is not None and total >= previous else total
+            self.last_totals[camera_id] = total
+            hour = hour_start(timestamp)
+            self._bucket(branch_id, hour).add(camera_id, count, visitors, self.minutes)
+            self.dirty.add((branch_id, hour))
+            self.samples += 1
+
+    def flush(self):
+        """Upsert the changed hours and their days; returns the hours written."""
+        with self.lock:
+            dirty, self.dirty = self.dirty, set()
+            hourly = [
+                HourlyStats(branch_id=branch_id, hour=hour, **{
+                    field: getattr(self.buckets[(branch_id, hour)], field) for field in HOURLY_FIELDS
+                })
+                for branch_id, hour in sorted(dirty)
+            ]
+        if not hourly:
+            return 0
+
+        days = {(row.branch_id, timezone.localtime(row.hour).date()) for row in hourly}
+        try:
+            with transaction.atomic():
+                HourlyStats.objects.bulk_create(
+                    hourly, update_conflicts=True,
+                    unique_fields=['branch', 'hour'], update_fields=HOURLY_FIELDS
+                )
+                DailyStats.objects.bulk_create(
+                    [self.daily_stats(branch_id, day) for branch_id, day in sorted(days)],
+                    update_conflicts=True,
+                    unique_fields=['branch', 'date'], update_fields=DAILY_FIELDS
+                )
+        except Exception:
+            # Retry with the next flush
+            with self.lock:
+                self.dirty |= dirty
+            raise
+        with self.lock:
+            self._evict()
+        self.flushes += 1
+        return len(hourly)
+
+    @staticmethod
+    def daily_stats(branch_id, day):
+        """DailyStats of a local day, from its (at most 24) hourly rows."""
+        start = timezone.make_aware(datetime.combine(day, time.min))
+        hours = list(HourlyStats.objects.filter(
+            branch_id=branch_id, hour__gte=start, hour__lt=start + timedelta(days=1)
+        ).values_list('hour', 'total_count', 'peak_count', 'unique_visitors'))
+        peak = max(hours, key=lambda row: row[2], default=None)
+        return DailyStats(
+            branch_id=branch_id,
+            date=day,
+            total_count=sum(row[1] for row in hours),
+            peak_hour=timezone.localtime(peak[0]).hour if peak else None,
+            peak_count=peak[2] if peak else 0,
+            unique_visitors=sum(row[3] for row in hours),
+        )
+
+    def _evict(self):
+        # Keep only the recent hours that can still receive samples
+        if not self.buckets:
+            return
+        horizon = max(hour for _, hour in self.buckets) - timedelta(hours=self.keep_hours)
+        for key in [key for key in self.buckets if key[1] < horizon and key not in self.dirty]:
+            del self.buckets[key]
+
+    def stats(self):
+        return {
+            'samples': self.samples,
+            'buckets': len(self.buckets),
+            'dirty_hours': len(self.dirty),
+            'flushes': self.flushes,
+        }
@@ -0,0 +1,182 @@
+# counter/utils/scheduler.py
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class InferenceRequest:
+    """
+    A frame waiting for detection. The submitting pipeline blocks on
+    wait() until the scheduler has run the batch containing it.
+    """
+    def __init__(self, camera_id, frame):
+        self.camera_id = camera_id
+        self.frame = frame
+        self.submitted_at = time.perf_counter()
+        self.detections = None
+        self.error = None
+        self._done = threading.Event()
+
+    def set_result(self, detections=None, error=None):
+        self.detections = detections
+        self.error = error
+        self._done.set()
+
+    def wait(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Inference timed out for camera {self.camera_id}")
+        if self.error is not None:
+            raise self.error
+        return self.detections
+
+class InferenceScheduler:
+    """
+    Collects the latest frame from every active camera and runs them through
+    the detector as one batch.
+
+    A batch is dispatched as soon as ``max_batch_size`` cameras are waiting
+    (or every active camera, when there are fewer) or ``max_wait`` seconds
+    after the first frame arrived, whichever comes first. A camera is active
+    from its first submission until it is unregistered. Each camera has at
+    most one pending frame; a newer submission replaces the older one, which
+    is resolved with no detections.
+    """
+    def __init__(self, detect_batch, max_batch_size=8, max_wait=0.01, log_interval=500):
+        self.detect_batch = detect_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max_wait
+        self.log_interval = log_interval
+        self._pending = {}
+        self._cameras = set()
+        self._cond = threading.Condition()
+        self._stopped = threading.Event()
+
+        # Batch statistics
+        self.batches = 0
+        self.frames = 0
+        self.superseded = 0
+        self.last_batch_size = 0
+        self.last_latency = 0.0
+        self.last_queue_delay = 0.0
+        self.avg_latency = 0.0
+        self.avg_occupancy = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, camera_id, frame):
+        request = InferenceRequest(camera_id, frame)
+        with self._cond:
+            self._cameras.add(camera_id)
+            previous = self._pending.pop(camera_id, None)
+            self._pending[camera_id] = request
+            self._cond.notify()
+        if previous is not None:
+            self.superseded += 1
+            previous.set_result([])
+        return request
+
+    def unregister(self, camera_id):
+        """Stop waiting for a camera that no longer submits frames."""
+        with self._cond:
+            self._cameras.discard(camera_id)
+            pending = self._pending.pop(camera_id, None)
+            self._cond.notify()
+        if pending is not None:
+            pending.set_result([])
+
+    def detect(self, camera_id, frame, timeout=10.0):
+        """Submit a frame and block until its detections are available."""
+        return self.submit(camera_id, frame).wait(timeout)
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending and not self._stopped.is_set():
+                self._cond.wait(0.5)
+            if self._stopped.is_set():
+                return []
+
+            # Give other cameras a short window to join the batch; the batch
+            # cannot grow past the number of active cameras
+            oldest = min(r.submitted_at for r in self._pending.values())
+            deadline = oldest + self.max_wait
+            while (len(self._pending) < min(self.max_batch_size, len(self._cameras))
+                   and not self._stopped.is_set()):
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            requests = sorted(self._pending.values(), key=lambda r: r.submitted_at)
+            batch = requests[:self.max_batch_size]
+            for request in batch:
+                del self._pending[request.camera_id]
+            return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            try:
+                results = self.detect_batch([r.frame for r in batch])
+            except Exception as e:
+                logger.error(f"Error in batched inference: {e}")
+                for request in batch:
+                    request.set_result(error=e)
+                continue
+            latency = time.perf_counter() - start
+
+            for request, detections in zip(batch, results):
+                request.set_result(detections)
+
+            self._record(batch, start, latency)
+
+    def _record(self, batch, start, latency):
+        size = len(batch)
+        occupancy = size / self.max_batch_size
+        self.batches += 1
+        self.frames += size
+        self.last_batch_size = size
+        self.last_latency = latency
+        self.last_queue_delay = start - batch[0].submitted_at
+        # Exponential moving averages keep the numbers readable at high rates
+        alpha = 0.05 if self.batches > 1 else 1.0
+        self.avg_latency += alpha * (latency - self.avg_latency)
+        self.avg_occupancy += alpha * (occupancy - self.avg_occupancy)
+
+        if self.log_interval and self.batches % self.log_interval == 0:
+            logger.info(
+                f"Inference batches: {self.batches}, "
+                f"avg latency {self.avg_latency * 1000:.1f} ms, "
+                f"avg occupancy {self.avg_occupancy:.0%}"
+            )
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'frames': self.frames,
+            'superseded': self.superseded,
+            'pending': len(self._pending),
+            'cameras': len(self._cameras),
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'last_batch_size': self.last_batch_size,
+            'last_latency_ms': round(self.last_latency * 1000, 2),
+            'last_queue_delay_ms': round(self.last_queue_delay * 1000, 2),
+            'avg_latency_ms': round(self.avg_latency * 1000, 2),
+            'avg_occupancy': round(self.avg_occupancy, 3),
+            'avg_batch_size': round(self.frames / self.batches, 2) if self.batches else 0,
+        }
+
+    def stop(self):
+        self._stopped.set()
+        with self._cond:
+            pending = list(self._pending.values())
+            self._pending.clear()
+            self._cond.notify_all()
+        for request in pending:
+            request.set_result([])
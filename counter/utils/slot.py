@@ -0,0 +1,122 @@
+# counter/utils/slot.py
+import asyncio
+import threading
+import time
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+class FrameSlot:
+    """
+    Single-entry slot holding the newest frame published by a producer thread.
+
+    The producer replaces the entry wholesale, so consumers can grab the
+    current frame without taking a lock; the condition is only used by
+    consumers that want to block until a newer frame arrives. Frames nobody
+    picked up in time are simply overwritten.
+
+    With ``refcounted`` the frames are PooledFrames: the slot holds one
+    reference to the current frame, hands every consumer its own retained
+    reference (to be released by the consumer) and releases the frame it
+    replaces. Taking a frame then needs the lock, so that it cannot be
+    recycled between being read and being retained.
+
+    Coroutines wait with wait_newer_async(), which parks a future on the
+    caller's event loop instead of a thread.
+    """
+    def __init__(self, refcounted=False):
+        self._entry = None
+        self._seq = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._async_waiters = set()
+        self.refcounted = refcounted
+
+    def publish(self, frame, timestamp=None):
+        with self._cond:
+            self._seq += 1
+            previous = self._entry
+            self._entry = (self._seq, timestamp or time.time(), frame)
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, set()
+        self._wake_async(waiters)
+        if self.refcounted and previous is not None:
+            previous[2].release()
+        return self._seq
+
+    @staticmethod
+    def _wake_async(waiters):
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                # The waiter's event loop is already closed
+                pass
+
+    def _take(self, seq=-1):
+        # Newest entry if newer than seq, retained for the caller if needed
+        if not self.refcounted:
+            entry = self._entry
+            return entry if entry is not None and entry[0] > seq else None
+        with self._cond:
+            entry = self._entry
+            if entry is None or entry[0] <= seq:
+                return None
+            entry[2].retain()
+            return entry
+
+    def latest(self):
+        """Return (seq, timestamp, frame) of the newest frame or None."""
+        return self._take()
+
+    def wait_newer(self, seq, timeout=None):
+        """Block until a frame newer than ``seq`` is published."""
+        entry = self._take(seq)
+        if entry is not None:
+            return entry
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._closed or (self._entry is not None and self._entry[0] > seq),
+                timeout
+            )
+        return self._take(seq)
+
+    async def wait_newer_async(self, seq, timeout=None):
+        """wait_newer() for coroutines; does not block the event loop."""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            entry = self._take(seq)
+            if entry is not None or self._closed:
+                return entry
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                return None
+
+            waiter = (loop, loop.create_future())
+            with self._cond:
+                if self._closed or (self._entry is not None and self._entry[0] > seq):
+                    waiter[1].set_result(None)
+                else:
+                    self._async_waiters.add(waiter)
+            try:
+                await asyncio.wait_for(waiter[1], remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._cond:
+                    self._async_waiters.discard(waiter)
+
+    def close(self):
+        """Wake up all waiting consumers; no further frames will arrive."""
+        with self._cond:
+            self._closed = True
+            entry = None
+            if self.refcounted:
+                entry, self._entry = self._entry, None
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, set()
+        self._wake_async(waiters)
+        if entry is not None:
+            entry[2].release()
@@ -0,0 +1,154 @@
+# counter/utils/tracking.py
+import numpy as np
+import threading
+from sort.sort import Sort, VectorizedSort
+from .pool import FramePool
+
+# Interchangeable SORT implementations with identical output
+TRACKER_ENGINES = {
+    'kalman': Sort,
+    'vectorized': VectorizedSort,
+}
+
+class DetectionStride:
+    """
+    Decides on which frames a camera runs the detector. In between, the
+    tracker coasts on its Kalman predictions.
+
+    With ``adaptive`` set the stride starts at 1 and grows by one after every
+    quiet detection frame up to ``max_stride``; as soon as the number of
+    tracks changes or the mean IOU of the matched detections drops below
+    ``min_match_iou`` it falls back to detecting every frame. Without it the
+    detector simply runs every ``max_stride`` frames.
+    """
+    def __init__(self, max_stride=1, adaptive=True, min_match_iou=0.5):
+        self.max_stride = max(1, int(max_stride))
+        self.adaptive = adaptive
+        self.min_match_iou = min_match_iou
+        self.stride = 1 if adaptive else self.max_stride
+        self.countdown = 0
+        self.last_track_count = None
+        self.frames_detected = 0
+        self.frames_coasted = 0
+
+    @property
+    def due(self):
+        """True if the detector should run on the next frame."""
+        return self.countdown <= 0
+
+    def coasted(self):
+        self.countdown -= 1
+        self.frames_coasted += 1
+
+    def detected(self, track_count, match_iou):
+        self.frames_detected += 1
+        if self.adaptive:
+            changed = self.last_track_count is not None and track_count != self.last_track_count
+            uncertain = match_iou is not None and match_iou < self.min_match_iou
+            if changed or uncertain:
+                self.stride = 1
+            else:
+                self.stride = min(self.stride + 1, self.max_stride)
+        self.last_track_count = track_count
+        self.countdown = self.stride - 1
+
+    def stats(self):
+        frames = self.frames_detected + self.frames_coasted
+        return {
+            'detection_stride': self.stride,
+            'max_detection_stride': self.max_stride,
+            'frames_detected': self.frames_detected,
+            'frames_coasted': self.frames_coasted,
+            'coasted_ratio': round(self.frames_coasted / frames, 3) if frames else 0.0,
+        }
+
+class TrackingContext:
+    """
+    Tracker state for a single camera: its own Sort instance, the set of IDs
+    seen so far and the colours assigned to them. Contexts are independent,
+    so cameras can be tracked in parallel without a global lock.
+    """
+    def __init__(self, camera_id, engine='vectorized', max_age=20, min_hits=3, iou_threshold=0.25,
+                 detection_stride=1, adaptive_stride=True, motion_gate=None, roi=None):
+        self.camera_id = camera_id
+        self.roi = roi
+        self.stride = DetectionStride(detection_stride, adaptive=adaptive_stride)
+        self.motion = motion_gate
+        self._reuse = False
+        # Annotation buffers; the current one is released on the next frame
+        self.frame_pool = FramePool()
+        self._canvas = None
+        # Tracks reported for the latest frame
+        self.tracks = np.empty((0, 5))
+        tracker_class = TRACKER_ENGINES[engine]
+        self.tracker = tracker_class(
+            max_age=max_age, min_hits=min_hits, iou_threshold=iou_threshold, gated=True
+        )
+        self.unique_ids = set()
+        self.frame_count = 0
+        # Only contended if two threads process the same camera
+        self.lock = threading.Lock()
+
+    def needs_inference(self, frame):
+        """
+        Decide whether the detector has to run on this frame. It does not
+        on frames skipped by the detection stride, which coast on the
+        tracker's predictions, or when the motion gate sees no change, in
+        which case the previous detections are reused.
+        """
+        self._reuse = False
+        if not self.stride.due:
+            return False
+        if self.motion is not None and not self.motion.check(frame):
+            self._reuse = True
+            return False
+        return True
+
+    def update(self, detections):
+        """
+        Advance the tracker by one frame and record the IDs it reports.
+        ``detections`` is None on frames the detector did not run on.
+        """
+        self.frame_count += 1
+        if detections is None and self._reuse:
+            detections = self.motion.detections
+        elif detections is not None and self.motion is not None:
+            self.motion.record(detections)
+        self._reuse = False
+
+        if detections is None:
+            self.stride.coasted()
+            self.tracks = self.tracker.predict()
+            return self.tracks
+
+        if len(detections) > 0:
+            dets = np.asarray(detections, dtype=float).reshape(-1, 5)
+        else:
+            dets = np.empty((0, 5))
+        # Sort must be stepped every frame, even without detections, so that
+        # lost tracks age out instead of freezing in place
+        tracked_objects = self.tracker.update(dets)
+        self.stride.detected(len(tracked_objects), self.tracker.last_match_iou)
+        self.unique_ids.update(int(track_id) for track_id in tracked_objects[:, 4])
+        self.tracks = tracked_objects
+        return tracked_objects
+
+    @property
+    def total_unique(self):
+        return len(self.unique_ids)
+
+    def canvas(self, frame):
+        """
+        Copy ``frame`` into a pooled buffer to draw on. The buffer stays
+        valid until the next call.
+        """
+        if self._canvas is not None:
+            self._canvas.release()
+        self._canvas = self.frame_pool.copy(frame)
+        return self._canvas.array
+
+    def stats(self):
+        stats = self.stride.stats()
+        if self.motion is not None:
+            stats.update(self.motion.stats())
+        return stats
@@ -1,17 +1,26 @@
 # counter/views.py
 from django.shortcuts import render, get_object_or_404
+from django.conf import settings
 from django.http import StreamingHttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
 from django.db.models import Sum
 from django.core.files import File
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
+import asyncio
 import cv2
 import numpy as np
 import time
-from datetime import datetime, timedelta
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
 import json
 import logging
+from .models import Branch, Camera, DailyStats, HourlyStats
 from .utils.counter import StreamManager
+from .utils.results import BranchFeed
+from .utils.history import MAX_POINTS, bucket_width, count_series
+from .utils.broadcaster import ANNOTATED, RAW, TRACKS
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -53,35 +62,65 @@ def dashboard(request):
         logger.error(f"Error in dashboard view: {e}")
         return JsonResponse({'error': 'Internal server error'}, status=500)
 
-def video_feed(request):
+def is_async_server(request):
     """
-    Generate video feed with person detection and tracking
+    True when served by an ASGI server. Streaming bodies must then be async
+    iterators (Django would buffer a sync one completely), while a WSGI
+    worker needs sync ones.
+    """
+    return isinstance(request, ASGIRequest)
+
+async def video_feed(request):
+    """
+    Generate video feed with person detection and tracking. With
+    ``overlay=1`` the frames are sent without annotations and the browser
+    draws the boxes from the video-tracks feed. ``tier`` picks one of the
+    COUNTER_ENCODE_TIERS renditions (resolution, JPEG quality, frame rate).
+
+    Under ASGI viewers wait on the pipeline on the event loop, so a single
+    process can hold hundreds of them without a thread each.
     """
     stream_url = request.GET.get('url')
     if not stream_url:
         return JsonResponse({'error': 'No URL provided'}, status=400)
+    channel = RAW if request.GET.get('overlay') in ('1', 'true') else ANNOTATED
+    tier = request.GET.get('tier') or None
+    if tier is not None and tier not in stream_manager.encode_tiers:
+        return JsonResponse({'error': f'Unknown tier, expected one of {sorted(stream_manager.encode_tiers)}'}, status=400)
+    # Loads the model on the first viewer
+    if not await sync_to_async(stream_manager.start)():
+        return JsonResponse({'error': 'Person detector unavailable'}, status=503)
+    camera_id = f"camera_{hash(stream_url)}"
+    frame_timeout = 10
 
     def generate_frames():
-        camera_id = f"camera_{hash(stream_url)}"
-        frame_timeout = 10
         last_frame_time = time.time()  # Now this will work correctly
 
+        # All viewers of a camera share one pipeline; we only receive the
+        # encoded frames it publishes.
+        subscription = stream_manager.subscribe(camera_id, stream_url, channel, tier)
+        if subscription is None:
+            return
+
         try:
             while True:
                 try:
-                    frame_bytes, current_count, total_count = stream_manager.get_frame(camera_id, stream_url)
+                    frame = subscription.next_frame(timeout=1.0)
                     
-                    if frame_bytes is not None:
+                    if frame is not None:
+                        frame_bytes, current_count, total_count = frame
                         last_frame_time = time.time()
                         yield (b'--frame\r\n'
                               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+                    elif not subscription.active:
+                        # Pipeline was shut down underneath us
+                        break
                     else:
                         # Check for timeout
                         if time.time() - last_frame_time > frame_timeout:
                             logger.warning(f"Stream timeout for camera {camera_id}")
                             stream_manager.release_stream(camera_id)
                             break
-                        time.sleep(0.1)  # Prevent busy waiting
 
                 except Exception as e:
                     logger.error(f"Error in generate_frames: {e}")
@@ -89,17 +128,167 @@ def video_feed(request):
                     continue
 
         finally:
-            # Ensure stream is released when the generator exits
-            stream_manager.release_stream(camera_id)
+            # Detach this viewer; the pipeline stops with its last viewer
+            subscription.close()
+
+    async def agenerate_frames():
+        last_frame_time = time.time()
+
+        # Opening the stream and loading its ROI block, so they run in a thread
+        subscription = await sync_to_async(stream_manager.subscribe)(camera_id, stream_url, channel, tier)
+        if subscription is None:
+            return
+
+        try:
+            while True:
+                try:
+                    frame = await subscription.next_frame_async(timeout=1.0)
+
+                    if frame is not None:
+                        frame_bytes, current_count, total_count = frame
+                        last_frame_time = time.time()
+                        yield (b'--frame\r\n'
+                              b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+                    elif not subscription.active:
+                        # Pipeline was shut down underneath us
+                        break
+                    elif time.time() - last_frame_time > frame_timeout:
+                        logger.warning(f"Stream timeout for camera {camera_id}")
+                        await sync_to_async(stream_manager.release_stream)(camera_id)
+                        break
+
+                except Exception as e:
+                    logger.error(f"Error in generate_frames: {e}")
+                    await asyncio.sleep(1)  # Prevent rapid retries on error
+                    continue
+
+        finally:
+            # Stopping the pipeline with the last viewer joins its thread
+            await sync_to_async(subscription.close)()
 
     return StreamingHttpResponse(
-        generate_frames(),
+        agenerate_frames() if is_async_server(request) else generate_frames(),
         content_type='multipart/x-mixed-replace; boundary=frame'
     )
+
+async def video_tracks(request):
+    """
+    Server-sent events with the track list (boxes, IDs and counts) of every
+    processed frame, for viewers drawing the overlay themselves
+    """
+    stream_url = request.GET.get('url')
+    if not stream_url:
+        return JsonResponse({'error': 'No URL provided'}, status=400)
+    if not await sync_to_async(stream_manager.start)():
+        return JsonResponse({'error': 'Person detector unavailable'}, status=503)
+    camera_id = f"camera_{hash(stream_url)}"
+
+    def generate_events():
+        subscription = stream_manager.subscribe(camera_id, stream_url, TRACKS)
+        if subscription is None:
+            return
+
+        try:
+            while subscription.active:
+                tracks = subscription.next_frame(timeout=5.0)
+                if tracks is None:
+                    # Keep proxies from closing an idle connection
+                    yield ': keepalive\n\n'
+                    continue
+                yield f'data: {tracks}\n\n'
+        finally:
+            subscription.close()
+
+    async def agenerate_events():
+        subscription = await sync_to_async(stream_manager.subscribe)(camera_id, stream_url, TRACKS)
+        if subscription is None:
+            return
+
+        try:
+            while subscription.active:
+                tracks = await subscription.next_frame_async(timeout=5.0)
+                if tracks is None:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f'data: {tracks}\n\n'
+        finally:
+            await sync_to_async(subscription.close)()
+
+    response = StreamingHttpResponse(
+        agenerate_events() if is_async_server(request) else generate_events(),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+async def branch_stats_stream(request):
+    """
+    Server-sent events with the count and total of every camera of a
+    branch, keyed by camera number. An event only carries the cameras whose
+    values changed, changes are coalesced into at most one event every
+    COUNTER_PUSH_INTERVAL seconds, and a keepalive comment goes out when
+    nothing changed for COUNTER_PUSH_HEARTBEAT seconds. Only published
+    results are read; no pipeline is started.
+    """
+    branch_name = request.GET.get('branch')
+    if branch_name not in BRANCH_DICT:
+        return JsonResponse({'error': 'Unknown branch'}, status=404)
+    cameras = {
+        str(number): f"camera_{hash(url)}"
+        for number, url in enumerate(BRANCH_DICT[branch_name], start=1)
+    }
+    interval = getattr(settings, 'COUNTER_PUSH_INTERVAL', 0.5)
+    heartbeat = getattr(settings, 'COUNTER_PUSH_HEARTBEAT', 15.0)
+
+    def event(changes):
+        return f"data: {json.dumps({'time': time.time(), 'cameras': changes}, separators=(',', ':'))}\n\n"
+
+    def generate_events():
+        feed = BranchFeed(stream_manager.results, cameras)
+        last_sent = time.time()
+        yield 'retry: 3000\n\n'
+        while True:
+            changes = feed.changes()
+            if changes:
+                last_sent = time.time()
+                yield event(changes)
+            elif time.time() - last_sent >= heartbeat:
+                last_sent = time.time()
+                yield ': keepalive\n\n'
+            time.sleep(interval)
+
+    async def agenerate_events():
+        feed = BranchFeed(stream_manager.results, cameras)
+        last_sent = time.time()
+        yield 'retry: 3000\n\n'
+        while True:
+            changes = feed.changes()
+            if changes:
+                last_sent = time.time()
+                yield event(changes)
+            elif time.time() - last_sent >= heartbeat:
+                last_sent = time.time()
+                yield ': keepalive\n\n'
+            # Sleep until any camera has a new result, then give the
+            # others the rest of the interval to coalesce with it
+            await feed.wait_async(timeout=max(0.0, heartbeat - (time.time() - last_sent)))
+            await asyncio.sleep(interval)
+
+    response = StreamingHttpResponse(
+        agenerate_events() if is_async_server(request) else generate_events(),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @csrf_exempt
-def get_camera_stats(request):
+async def get_camera_stats(request):
     """
-    Get real-time statistics for a camera
+    Get real-time statistics for a camera. With ``wait`` (seconds, at most
+    30) the request is held until the pipeline publishes a result newer
+    than ``since``, the ``seq`` of the previous response (long polling).
     """
     stream_url = request.GET.get('url')
     if not stream_url:
@@ -107,14 +296,37 @@ def get_camera_stats(request):
     
     try:
         camera_id = f"camera_{hash(stream_url)}"
-        _, current_count, total_count = stream_manager.get_frame(camera_id, stream_url)
+        wait = min(float(request.GET.get('wait') or 0), 30.0)
+        since = int(request.GET.get('since') or 0)
+        # Read the last result published by the camera's pipeline; this never
+        # decodes a frame or runs the model.
+        if wait > 0:
+            latest = await stream_manager.results.wait_newer_async(camera_id, since, wait)
+        else:
+            latest = stream_manager.results.latest(camera_id)
+        if latest is None:
+            return JsonResponse({
+                'count': 0,
+                'total': 0,
+                'seq': 0,
+                'timestamp': timezone.now().isoformat(),
+                'frame_timestamp': None,
+                'age': None,
+                'status': 'no_data'
+            })
         
+        seq, result = latest
         return JsonResponse({
-            'count': current_count,
-            'total': total_count,
+            'count': result.count,
+            'total': result.total,
+            'seq': seq,
             'timestamp': timezone.now().isoformat(),
+            'frame_timestamp': datetime.fromtimestamp(result.frame_time, tz=dt_timezone.utc).isoformat(),
+            'age': round(time.time() - result.frame_time, 3),
             'status': 'success'
         })
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid wait or since: {e}', 'status': 'error'}, status=400)
     except Exception as e:
         logger.error(f"Error getting camera stats: {e}")
         return JsonResponse({
@@ -132,12 +344,19 @@ def stream_view(request):
     
     if not stream_url or not branch_name:
         return JsonResponse({'error': 'URL and branch name required'}, status=400)
+    tier = request.GET.get('tier', '')
+    if tier and tier not in stream_manager.encode_tiers:
+        return JsonResponse({'error': f'Unknown tier, expected one of {sorted(stream_manager.encode_tiers)}'}, status=400)
     
     try:
         context = {
             'stream_url': stream_url,
             'branch_name': branch_name,
-            'camera_number': camera_number
+            'camera_number': camera_number,
+            # Server-annotated frames unless ?overlay=1 asks for the
+            # browser-drawn overlay
+            'overlay': request.GET.get('overlay') in ('1', 'true'),
+            'tier': tier,
         }
         return render(request, 'counter/stream.html', context)
     except Exception as e:
@@ -210,9 +429,7 @@ def check_stream_status(request):
     
     try:
         camera_id = f"camera_{hash(url)}"
-        stream = stream_manager.get_stream(camera_id, url)
-        
-        if stream is None:
+        if not stream_manager.probe(camera_id, url):
             return JsonResponse({
                 'status': 'offline',
                 'url': url
@@ -228,4 +445,129 @@ def check_stream_status(request):
             'status': 'error',
             'error': str(e),
             'url': url
-        })
\ No newline at end of file
+        })
+
+def pipeline_stats(request):
+    """
+    Report batching and per-camera pipeline statistics
+    """
+    try:
+        return JsonResponse({
+            'status': 'success',
+            'timestamp': timezone.now().isoformat(),
+            **stream_manager.stats()
+        })
+    except Exception as e:
+        logger.error(f"Error getting pipeline stats: {e}")
+        return JsonResponse({'error': str(e)}, status=500)
+
+def branch_rollups(request):
+    """
+    Precomputed statistics of a branch: the DailyStats of the last ``days``
+    days and today's HourlyStats, as kept up to date by the count writer
+    """
+    branch_name = request.GET.get('branch')
+    if not branch_name:
+        return JsonResponse({'error': 'Branch required'}, status=400)
+
+    try:
+        days = max(1, min(int(request.GET.get('days', 7)), 366))
+        branch = Branch.objects.filter(name=branch_name).first()
+        if branch is None:
+            return JsonResponse({'error': 'Unknown branch'}, status=404)
+
+        today = timezone.localdate()
+        daily = DailyStats.objects.filter(
+            branch=branch, date__gt=today - timedelta(days=days)
+        ).order_by('date')
+        hourly = HourlyStats.objects.filter(
+            branch=branch, hour__gte=timezone.make_aware(datetime.combine(today, datetime.min.time()))
+        ).order_by('hour')
+        return JsonResponse({
+            'status': 'success',
+            'branch': branch.name,
+            'daily': [{
+                'date': stats.date.isoformat(),
+                'total_count': stats.total_count,
+                'peak_hour': stats.peak_hour,
+                'peak_count': stats.peak_count,
+                'unique_visitors': stats.unique_visitors,
+            } for stats in daily],
+            'hourly': [{
+                'hour': timezone.localtime(stats.hour).isoformat(),
+                'samples': stats.samples,
+                'average_count': round(stats.average_count, 2),
+                'peak_count': stats.peak_count,
+                'unique_visitors': stats.unique_visitors,
+            } for stats in hourly],
+        })
+    except ValueError:
+        return JsonResponse({'error': 'Invalid days'}, status=400)
+    except Exception as e:
+        logger.error(f"Error getting branch rollups: {e}")
+        return JsonResponse({'error': str(e)}, status=500)
+
+def count_history(request):
+    """
+    Downsampled count history over a time range, for one camera (``camera``
+    id or stream ``url``) or all cameras of a ``branch``. ``start`` and
+    ``end`` are ISO 8601 (default: the last 24 hours); the range is split
+    into about ``points`` buckets unless ``resolution`` (seconds) is given.
+    Each bucket has the min, max and average count and the highest running
+    total (``max_total``).
+    A response holds at most ``limit`` buckets; pass its ``next_cursor`` as
+    ``cursor`` to continue.
+    """
+    try:
+        end = datetime.fromisoformat(request.GET['end']) if request.GET.get('end') else timezone.now()
+        start = datetime.fromisoformat(request.GET['start']) if request.GET.get('start') else end - timedelta(days=1)
+        if timezone.is_naive(start):
+            start = timezone.make_aware(start)
+        if timezone.is_naive(end):
+            end = timezone.make_aware(end)
+        points = max(1, min(int(request.GET.get('points', 300)), MAX_POINTS))
+        limit = max(1, min(int(request.GET.get('limit', points)), MAX_POINTS))
+        resolution = int(request.GET['resolution']) if request.GET.get('resolution') else None
+        cursor = int(request.GET['cursor']) if request.GET.get('cursor') else None
+        camera = int(request.GET['camera']) if request.GET.get('camera') else None
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid parameter: {e}'}, status=400)
+    if start >= end:
+        return JsonResponse({'error': 'start must be before end'}, status=400)
+
+    try:
+        if request.GET.get('branch'):
+            branch = Branch.objects.filter(name=request.GET['branch']).first()
+            if branch is None:
+                return JsonResponse({'error': 'Unknown branch'}, status=404)
+            subject = {'branch': branch.name}
+            camera_ids = list(branch.cameras.values_list('id', flat=True))
+        elif camera is not None or request.GET.get('url'):
+            cameras = Camera.objects.all()
+            if camera is not None:
+                cameras = cameras.filter(id=camera)
+            else:
+                cameras = cameras.filter(stream_url=request.GET['url'])
+            camera_id = cameras.values_list('id', flat=True).first()
+            if camera_id is None:
+                return JsonResponse({'error': 'Unknown camera'}, status=404)
+            subject = {'camera': camera_id}
+            camera_ids = [camera_id]
+        else:
+            return JsonResponse({'error': 'camera, url or branch required'}, status=400)
+
+        start_s, end_s = int(start.timestamp()), math.ceil(end.timestamp())
+        width = bucket_width(start_s, end_s, points, resolution)
+        series, next_cursor = count_series(camera_ids, start_s, end_s, width, limit, cursor)
+        return JsonResponse({
+            'status': 'success',
+            **subject,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'resolution': width,
+            'points': series,
+            'next_cursor': next_cursor,
+        })
+    except Exception as e:
+        logger.error(f"Error getting count history: {e}")
+        return JsonResponse({'error': str(e)}, status=500)
@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'person_counter.settings')
+# Request code runs on short-lived executor threads, which would leave their
+# persistent connections to the garbage collector; an explicit
+# COUNTER_CONN_MAX_AGE still wins
+os.environ.setdefault('COUNTER_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -125,4 +125,115 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Person counter pipeline
+
+# Frames from all active cameras are batched through the detector; a batch is
+# dispatched when it is full or after COUNTER_BATCH_WAIT seconds.
+COUNTER_BATCH_SIZE = int(os.environ.get('COUNTER_BATCH_SIZE', 8))
+COUNTER_BATCH_WAIT = float(os.environ.get('COUNTER_BATCH_WAIT', 0.01))
+
+# 'vectorized' keeps all Kalman tracks in stacked arrays, 'kalman' uses one
+# filterpy filter per track; both produce the same track IDs.
+COUNTER_TRACKER_ENGINE = os.environ.get('COUNTER_TRACKER_ENGINE', 'vectorized')
+
+# Run the detector at most every Nth frame and coast on the tracker's
+# predictions in between. With COUNTER_ADAPTIVE_STRIDE the stride grows up to
+# this value while the scene is quiet and drops back to 1 when the track count
+# changes. COUNTER_DETECTION_STRIDES overrides it per stream URL.
+COUNTER_DETECTION_STRIDE = int(os.environ.get('COUNTER_DETECTION_STRIDE', 4))
+COUNTER_ADAPTIVE_STRIDE = os.environ.get('COUNTER_ADAPTIVE_STRIDE', 'true').lower() == 'true'
+COUNTER_DETECTION_STRIDES = {}
+
+# Skip inference and reuse the last detections while a downscaled frame
+# difference shows less than COUNTER_MOTION_THRESHOLD of the pixels changing;
+# inference is still forced every COUNTER_MOTION_REFRESH seconds.
+COUNTER_MOTION_GATE = os.environ.get('COUNTER_MOTION_GATE', 'true').lower() == 'true'
+COUNTER_MOTION_THRESHOLD = float(os.environ.get('COUNTER_MOTION_THRESHOLD', 0.002))
+COUNTER_MOTION_REFRESH = float(os.environ.get('COUNTER_MOTION_REFRESH', 5.0))
+
+# Detector backend: 'torch' runs COUNTER_DETECTOR_WEIGHTS with ultralytics,
+# 'onnx' runs COUNTER_ONNX_MODEL on ONNX Runtime (optional dependency). Build
+# FP32 and INT8 ONNX models with `manage.py export_detector` and compare them
+# with `manage.py check_detector_parity`. COUNTER_ONNX_PROVIDERS is a comma
+# separated list, e.g. OpenVINOExecutionProvider,CPUExecutionProvider.
+COUNTER_DETECTOR_BACKEND = os.environ.get('COUNTER_DETECTOR_BACKEND', 'torch')
+COUNTER_DETECTOR_WEIGHTS = os.environ.get('COUNTER_DETECTOR_WEIGHTS', 'yolov8n.pt')
+COUNTER_ONNX_MODEL = os.environ.get('COUNTER_ONNX_MODEL', 'yolov8n.onnx')
+COUNTER_ONNX_PROVIDERS = [p for p in os.environ.get('COUNTER_ONNX_PROVIDERS', 'CPUExecutionProvider').split(',') if p]
+COUNTER_DETECTOR_CONF = float(os.environ.get('COUNTER_DETECTOR_CONF', 0.25))
+COUNTER_DETECTOR_IOU = float(os.environ.get('COUNTER_DETECTOR_IOU', 0.7))
+COUNTER_DETECTOR_MAX_DET = int(os.environ.get('COUNTER_DETECTOR_MAX_DET', 100))
+
+# CPU inference profile. Each worker process gets COUNTER_CPU_THREADS
+# intra-op threads, by default the cores split evenly between the
+# COUNTER_WORKER_PROCESSES serving streams. The detector is loaded and warmed
+# with a dummy batch when the first camera starts. channels_last and
+# torch.compile (a mode name or 'default') are off until
+# `manage.py benchmark_detector` shows a gain.
+COUNTER_WORKER_PROCESSES = int(os.environ.get('COUNTER_WORKER_PROCESSES', 1))
+COUNTER_CPU_THREADS = int(os.environ.get('COUNTER_CPU_THREADS', 0))
+COUNTER_INTEROP_THREADS = int(os.environ.get('COUNTER_INTEROP_THREADS', 1))
+COUNTER_DETECTOR_WARMUP = os.environ.get('COUNTER_DETECTOR_WARMUP', 'true').lower() == 'true'
+COUNTER_TORCH_CHANNELS_LAST = os.environ.get('COUNTER_TORCH_CHANNELS_LAST', 'false').lower() == 'true'
+COUNTER_TORCH_COMPILE = os.environ.get('COUNTER_TORCH_COMPILE', '') or False
+
+# JPEG renditions of the video feed, picked with its ?tier= parameter. Frames
+# are scaled down to `height` (None keeps the source size), encoded at
+# `quality` and sent at most `max_fps` times a second (None: every frame).
+# Each tier is encoded once per frame and only while someone watches it.
+COUNTER_ENCODE_TIERS = {
+    'full': {'height': None, 'quality': 80, 'max_fps': None},
+    '720p': {'height': 720, 'quality': 75, 'max_fps': 15},
+    '360p': {'height': 360, 'quality': 60, 'max_fps': 5},
+}
+COUNTER_DEFAULT_TIER = os.environ.get('COUNTER_DEFAULT_TIER', 'full')
+
+# Branch push stream: changed counts are sent at most every
+# COUNTER_PUSH_INTERVAL seconds, idle connections get a keepalive every
+# COUNTER_PUSH_HEARTBEAT seconds.
+COUNTER_PUSH_INTERVAL = float(os.environ.get('COUNTER_PUSH_INTERVAL', 0.5))
+COUNTER_PUSH_HEARTBEAT = float(os.environ.get('COUNTER_PUSH_HEARTBEAT', 15.0))
+
+# Count history: one PersonCount row per camera every COUNTER_PERSIST_INTERVAL
+# seconds, written in the background with bulk inserts of up to
+# COUNTER_PERSIST_BATCH rows at least every COUNTER_PERSIST_FLUSH seconds.
+# Samples beyond COUNTER_PERSIST_QUEUE waiting rows are dropped.
+COUNTER_PERSIST_INTERVAL = float(os.environ.get('COUNTER_PERSIST_INTERVAL', 300))
+COUNTER_PERSIST_QUEUE = int(os.environ.get('COUNTER_PERSIST_QUEUE', 1000))
+COUNTER_PERSIST_BATCH = int(os.environ.get('COUNTER_PERSIST_BATCH', 100))
+COUNTER_PERSIST_FLUSH = float(os.environ.get('COUNTER_PERSIST_FLUSH', 5.0))
+# HourlyStats/DailyStats are updated from the written samples every
+# COUNTER_ROLLUP_INTERVAL seconds; `manage.py rebuild_rollups` recomputes them.
+# Their total_count is in person-minutes, each sample standing for
+# COUNTER_PERSIST_INTERVAL seconds.
+COUNTER_ROLLUP_INTERVAL = float(os.environ.get('COUNTER_ROLLUP_INTERVAL', 60))
+
+# SQLite production mode. WAL lets dashboard reads run while the count
+# writer commits, and write transactions take the lock when they begin
+# (BEGIN IMMEDIATE), waiting up to COUNTER_SQLITE_BUSY_TIMEOUT seconds for it
+# instead of failing with "database is locked". The PRAGMAs are applied to
+# every new connection. WSGI worker threads keep theirs for
+# COUNTER_CONN_MAX_AGE seconds; under ASGI each request runs its sync code on
+# a new thread, so person_counter/asgi.py defaults it to 0 there. The count
+# writer keeps its own connection either way. Compare with
+# `manage.py benchmark_sqlite`.
+COUNTER_SQLITE_TUNED = os.environ.get('COUNTER_SQLITE_TUNED', 'true').lower() == 'true'
+COUNTER_SQLITE_BUSY_TIMEOUT = float(os.environ.get('COUNTER_SQLITE_BUSY_TIMEOUT', 20))
+COUNTER_SQLITE_SYNCHRONOUS = os.environ.get('COUNTER_SQLITE_SYNCHRONOUS', 'NORMAL')
+COUNTER_SQLITE_CACHE_KB = int(os.environ.get('COUNTER_SQLITE_CACHE_KB', 20000))
+COUNTER_CONN_MAX_AGE = int(os.environ.get('COUNTER_CONN_MAX_AGE', 600))
+if COUNTER_SQLITE_TUNED and DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default']['OPTIONS'] = {
+        'timeout': COUNTER_SQLITE_BUSY_TIMEOUT,
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': ';'.join([
+            'PRAGMA journal_mode=WAL',
+            f'PRAGMA synchronous={COUNTER_SQLITE_SYNCHRONOUS}',
+            f'PRAGMA cache_size=-{COUNTER_SQLITE_CACHE_KB}',
+            'PRAGMA temp_store=MEMORY',
+        ]),
+    }
+    DATABASES['default']['CONN_MAX_AGE'] = COUNTER_CONN_MAX_AGE
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
 print(os.path.join(BASE_DIR, 'templates'))
@@ -0,0 +1,162 @@
+"""
+    Micro-benchmarks for the SORT tracker.
+
+    Run from the repository root:
+
+      $ python -m sort.benchmark association
+      $ python -m sort.benchmark imports
+"""
+from __future__ import print_function
+
+import argparse
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from sort import sort
+from sort.sort import iou_batch, associate_detections_to_trackers, associate_detections_to_trackers_gated
+
+
+def legacy_associate_detections_to_trackers(detections,trackers,iou_threshold = 0.3):
+  """
+  The association step as it was before the vectorised rewrite: solver
+  imports on every call and Python loops with O(N*M) membership tests. Kept
+  here only as the baseline for the benchmark.
+  """
+  if(len(trackers)==0):
+    return np.empty((0,2),dtype=int), np.arange(len(detections)), np.empty((0,5),dtype=int)
+
+  iou_matrix = iou_batch(detections, trackers)
+
+  if min(iou_matrix.shape) > 0:
+    a = (iou_matrix > iou_threshold).astype(np.int32)
+    if a.sum(1).max() == 1 and a.sum(0).max() == 1:
+        matched_indices = np.stack(np.where(a), axis=1)
+    else:
+      try:
+        import lap
+        _, x, y = lap.lapjv(-iou_matrix, extend_cost=True)
+        matched_indices = np.array([[y[i],i] for i in x if i >= 0])
+      except ImportError:
+        from scipy.optimize import linear_sum_assignment
+        x, y = linear_sum_assignment(-iou_matrix)
+        matched_indices = np.array(list(zip(x, y)))
+  else:
+    matched_indices = np.empty(shape=(0,2))
+
+  unmatched_detections = []
+  for d, det in enumerate(detections):
+    if(d not in matched_indices[:,0]):
+      unmatched_detections.append(d)
+  unmatched_trackers = []
+  for t, trk in enumerate(trackers):
+    if(t not in matched_indices[:,1]):
+      unmatched_trackers.append(t)
+
+  matches = []
+  for m in matched_indices:
+    if(iou_matrix[m[0], m[1]]<iou_threshold):
+      unmatched_detections.append(m[0])
+      unmatched_trackers.append(m[1])
+    else:
+      matches.append(m.reshape(1,2))
+  if(len(matches)==0):
+    matches = np.empty((0,2),dtype=int)
+  else:
+    matches = np.concatenate(matches,axis=0)
+
+  return matches, np.array(unmatched_detections), np.array(unmatched_trackers)
+
+
+def crowd_frame(n, rng, jitter=6., density=50.):
+  """
+  Builds n tracker boxes scattered so that a 2000x2000 area holds about
+  `density` people, plus n detections that are jittered, shuffled copies of
+  them (a few of which overlap several trackers).
+  """
+  side = 2000. * np.sqrt(n / density)
+  xy = rng.uniform(0, side, (n, 2))
+  wh = rng.uniform(40, 120, (n, 2)) * np.array([1., 2.5])
+  trks = np.hstack((xy, xy + wh, np.zeros((n, 1))))
+  dets = trks.copy()
+  dets[:, :4] += rng.normal(0, jitter, (n, 4))
+  dets[:, 4] = rng.uniform(0.3, 1., n)
+  return dets[rng.permutation(n)], trks
+
+
+def time_call(fn, repeat, *args):
+  fn(*args)
+  start = time.perf_counter()
+  for _ in range(repeat):
+    result = fn(*args)
+  return (time.perf_counter() - start) / repeat, result
+
+
+def bench_association(sizes, repeat, iou_threshold, seed):
+  # time the sparse path at every size instead of its small-frame fallback
+  sort.DENSE_IOU_LIMIT = 0
+  engines = [
+    ('legacy', legacy_associate_detections_to_trackers),
+    ('dense', associate_detections_to_trackers),
+    ('gated', associate_detections_to_trackers_gated),
+  ]
+  rng = np.random.default_rng(seed)
+  print('%6s %12s %12s %12s %9s %9s' % ('people', 'legacy ms', 'dense ms', 'gated ms', 'dense x', 'gated x'))
+  for n in sizes:
+    dets, trks = crowd_frame(n, rng)
+    reps = max(3, repeat // n)
+    timings = []
+    for name, fn in engines:
+      elapsed, (matches, _, _) = time_call(fn, reps, dets, trks, iou_threshold)
+      timings.append(elapsed)
+    legacy = timings[0]
+    print('%6d %12.3f %12.3f %12.3f %8.1fx %8.1fx' % (
+      n, legacy * 1000, timings[1] * 1000, timings[2] * 1000, legacy / timings[1], legacy / timings[2]))
+
+
+IMPORT_TARGETS = [
+  ('sort.sort', 'import sort.sort'),
+  ('sort.sort + filterpy', 'import sort.sort; sort.sort.KalmanBoxTracker([0, 0, 1, 1])'),
+  # everything `import sort.sort` used to load
+  ('demo dependencies (before)', 'import sort.demo, filterpy.kalman'),
+]
+
+
+def bench_imports(repeat):
+  """
+  Times each import in a fresh interpreter, so nothing is already cached in
+  sys.modules. sort.demo now carries the matplotlib/skimage/argparse imports
+  that sort.sort used to pay on every import.
+  """
+  print('%-30s %10s %10s' % ('import', 'median ms', 'min ms'))
+  for name, statement in IMPORT_TARGETS:
+    code = 'import time; t = time.perf_counter(); %s; print(time.perf_counter() - t)' % statement
+    samples = []
+    for _ in range(repeat):
+      out = subprocess.check_output([sys.executable, '-c', code])
+      samples.append(float(out.decode().strip().splitlines()[-1]) * 1000)
+    print('%-30s %10.1f %10.1f' % (name, np.median(samples), min(samples)))
+
+
+def parse_args():
+    """Parse input arguments."""
+    parser = argparse.ArgumentParser(description='SORT micro-benchmarks')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+    association = subparsers.add_parser('association', help='Compare association paths on synthetic crowd frames.')
+    association.add_argument("--sizes", help="Number of people per frame.", type=int, nargs='+', default=[10, 50, 100, 200, 500])
+    association.add_argument("--repeat", help="Work budget; each size is timed repeat/size times (min 3).", type=int, default=5000)
+    association.add_argument("--iou_threshold", help="Minimum IOU for match.", type=float, default=0.3)
+    association.add_argument("--seed", help="Random seed for the synthetic frames.", type=int, default=0)
+    imports = subparsers.add_parser('imports', help='Measure the import time of the tracker library.')
+    imports.add_argument("--repeat", help="Fresh interpreters per measurement.", type=int, default=5)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+  args = parse_args()
+  if args.benchmark == 'association':
+    bench_association(args.sizes, args.repeat, args.iou_threshold, args.seed)
+  elif args.benchmark == 'imports':
+    bench_imports(args.repeat)
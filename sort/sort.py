@@ -17,31 +17,38 @@
 """
 from __future__ import print_function
 
-import os
 import numpy as np
-import matplotlib
-matplotlib.use('TkAgg')
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-from skimage import io
 
-import glob
-import time
-import argparse
-from filterpy.kalman import KalmanFilter
+# The MOT demo/visualisation CLI lives in sort/demo.py so that importing the
+# tracker only costs NumPy. filterpy (and the scipy.stats it pulls in) is
+# imported on first use by KalmanBoxTracker; VectorizedSort never needs it.
 
-np.random.seed(0)
+
+_solver = None
+
+
+def _get_solver():
+  """
+  Resolves the assignment solver once: lap if installed, scipy otherwise.
+  """
+  global _solver
+  if _solver is None:
+    try:
+      import lap
+      def _solver(cost_matrix):
+        _, x, y = lap.lapjv(cost_matrix, extend_cost=True)
+        cols = x[x >= 0]
+        return np.stack((y[cols], cols), axis=1)
+    except ImportError:
+      from scipy.optimize import linear_sum_assignment
+      def _solver(cost_matrix):
+        x, y = linear_sum_assignment(cost_matrix)
+        return np.stack((x, y), axis=1)
+  return _solver
 
 
 def linear_assignment(cost_matrix):
-  try:
-    import lap
-    _, x, y = lap.lapjv(cost_matrix, extend_cost=True)
-    return np.array([[y[i],i] for i in x if i >= 0]) #
-  except ImportError:
-    from scipy.optimize import linear_sum_assignment
-    x, y = linear_sum_assignment(cost_matrix)
-    return np.array(list(zip(x, y)))
+  return _get_solver()(cost_matrix).reshape(-1, 2).astype(int)
 
 
 def iou_batch(bb_test, bb_gt):
@@ -100,6 +107,7 @@ class KalmanBoxTracker(object):
     """
     Initialises a tracker using initial bounding box.
     """
+    from filterpy.kalman import KalmanFilter
     #define constant velocity model
     self.kf = KalmanFilter(dim_x=7, dim_z=4) 
     self.kf.F = np.array([[1,0,0,0,1,0,0],[0,1,0,0,0,1,0],[0,0,1,0,0,0,1],[0,0,0,1,0,0,0],  [0,0,0,0,1,0,0],[0,0,0,0,0,1,0],[0,0,0,0,0,0,1]])
@@ -144,6 +152,18 @@ class KalmanBoxTracker(object):
     self.history.append(convert_x_to_bbox(self.kf.x))
     return self.history[-1]
 
+  def coast(self):
+    """
+    Advances the state vector for a frame on which the detector was not run
+    and returns the predicted bounding box. Unlike predict() the frame does
+    not count as a missed detection.
+    """
+    if((self.kf.x[6]+self.kf.x[2])<=0):
+      self.kf.x[6] *= 0.0
+    self.kf.predict()
+    self.age += 1
+    return convert_x_to_bbox(self.kf.x)
+
   def get_state(self):
     """
     Returns the current bounding box estimate.
@@ -151,6 +171,25 @@ class KalmanBoxTracker(object):
     return convert_x_to_bbox(self.kf.x)
 
 
+def _split_unmatched(matched_indices, iou_matrix, iou_threshold):
+  """
+  Filters out matches below iou_threshold and returns matches,
+  unmatched_detections and unmatched_trackers, in the same order the
+  original per-element loops produced them.
+  """
+  matched_indices = np.asarray(matched_indices, dtype=int).reshape(-1, 2)
+  det_free = np.ones(iou_matrix.shape[0], dtype=bool)
+  det_free[matched_indices[:, 0]] = False
+  trk_free = np.ones(iou_matrix.shape[1], dtype=bool)
+  trk_free[matched_indices[:, 1]] = False
+
+  #filter out matched with low IOU
+  low = iou_matrix[matched_indices[:, 0], matched_indices[:, 1]] < iou_threshold
+  unmatched_detections = np.concatenate((np.flatnonzero(det_free), matched_indices[low, 0]))
+  unmatched_trackers = np.concatenate((np.flatnonzero(trk_free), matched_indices[low, 1]))
+  return matched_indices[~low], unmatched_detections, unmatched_trackers
+
+
 def associate_detections_to_trackers(detections,trackers,iou_threshold = 0.3):
   """
   Assigns detections to tracked object (both represented as bounding boxes)
@@ -171,41 +210,174 @@ def associate_detections_to_trackers(detections,trackers,iou_threshold = 0.3):
   else:
     matched_indices = np.empty(shape=(0,2))
 
-  unmatched_detections = []
-  for d, det in enumerate(detections):
-    if(d not in matched_indices[:,0]):
-      unmatched_detections.append(d)
-  unmatched_trackers = []
-  for t, trk in enumerate(trackers):
-    if(t not in matched_indices[:,1]):
-      unmatched_trackers.append(t)
+  return _split_unmatched(matched_indices, iou_matrix, iou_threshold)
 
-  #filter out matched with low IOU
-  matches = []
-  for m in matched_indices:
-    if(iou_matrix[m[0], m[1]]<iou_threshold):
-      unmatched_detections.append(m[0])
-      unmatched_trackers.append(m[1])
-    else:
-      matches.append(m.reshape(1,2))
-  if(len(matches)==0):
-    matches = np.empty((0,2),dtype=int)
-  else:
-    matches = np.concatenate(matches,axis=0)
 
-  return matches, np.array(unmatched_detections), np.array(unmatched_trackers)
+def _connected_components(edges, n_dets, n_trks):
+  """
+  Labels the connected components of the bipartite detection/tracker graph
+  given by its (E,2) edge list. Detections are nodes 0..n_dets-1 and
+  trackers n_dets..n_dets+n_trks-1. Returns one label per node.
+  """
+  labels = np.arange(n_dets + n_trks)
+  d = edges[:, 0]
+  t = edges[:, 1] + n_dets
+  while True:
+    # propagate the smallest label across every edge until stable
+    m = np.minimum(labels[d], labels[t])
+    new = labels.copy()
+    np.minimum.at(new, d, m)
+    np.minimum.at(new, t, m)
+    new = new[new]
+    if np.array_equal(new, labels):
+      return labels
+    labels = new
+
+
+# Below this many detection/tracker pairs the gated association falls back to
+# the dense path, whose fixed overhead is lower.
+DENSE_IOU_LIMIT = 4096
+
+
+def iou_pairs(bb_test, bb_gt):
+  """
+  Sparse counterpart of iou_batch. Boxes are swept by their x extent and the
+  IOU is only computed for pairs that overlap horizontally; every other pair
+  has an IOU of zero.
+
+  Returns the (E,2) array of [test, gt] index pairs and their IOUs.
+  """
+  if len(bb_test) == 0 or len(bb_gt) == 0:
+    return np.empty((0, 2), dtype=int), np.empty(0)
+  order = np.argsort(bb_gt[:, 0], kind='stable')
+  gt_x1 = bb_gt[order, 0]
+  max_w = np.max(bb_gt[:, 2] - bb_gt[:, 0])
+  # candidates satisfy test.x1 - max_w < gt.x1 < test.x2
+  lo = np.searchsorted(gt_x1, bb_test[:, 0] - max_w, side='right')
+  hi = np.searchsorted(gt_x1, bb_test[:, 2], side='left')
+  counts = np.maximum(hi - lo, 0)
+  total = counts.sum()
+  test_idx = np.repeat(np.arange(len(bb_test)), counts)
+  offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+  gt_idx = order[np.repeat(lo, counts) + offsets]
+
+  return np.stack((test_idx, gt_idx), axis=1), paired_iou(bb_test[test_idx], bb_gt[gt_idx])
+
+
+def paired_iou(bb_test, bb_gt):
+  """
+  Computes the IOU between aligned rows of two (N,4+) arrays of boxes in the
+  form [x1,y1,x2,y2]
+  """
+  xx1 = np.maximum(bb_test[..., 0], bb_gt[..., 0])
+  yy1 = np.maximum(bb_test[..., 1], bb_gt[..., 1])
+  xx2 = np.minimum(bb_test[..., 2], bb_gt[..., 2])
+  yy2 = np.minimum(bb_test[..., 3], bb_gt[..., 3])
+  w = np.maximum(0., xx2 - xx1)
+  h = np.maximum(0., yy2 - yy1)
+  wh = w * h
+  o = wh / ((bb_test[..., 2] - bb_test[..., 0]) * (bb_test[..., 3] - bb_test[..., 1])
+    + (bb_gt[..., 2] - bb_gt[..., 0]) * (bb_gt[..., 3] - bb_gt[..., 1]) - wh)
+  return o
+
+
+def associate_detections_to_trackers_gated(detections,trackers,iou_threshold = 0.3):
+  """
+  Fast path for associate_detections_to_trackers.
+
+  Pairs below iou_threshold can never survive the final filter, so they are
+  gated out up front and the IOU is only evaluated for boxes that overlap
+  horizontally (see iou_pairs). The remaining pairs form a sparse bipartite
+  graph whose connected components are independent assignment problems:
+  pairs with no competing candidate are matched directly and only the
+  ambiguous components go through the Hungarian solver, each on its own
+  small cost matrix. In crowded frames this replaces one large O(n^3) solve
+  over a dense IOU matrix with a few tiny ones; frames with fewer than
+  DENSE_IOU_LIMIT pairs solve the same gated matrix densely, so both paths
+  give the same matches.
+
+  Unlike associate_detections_to_trackers, which runs the solver on the
+  ungated matrix and may give up a match above the threshold for one below
+  it that is filtered out afterwards, only pairs at or above iou_threshold
+  take part in the assignment.
+
+  Returns 3 lists of matches, unmatched_detections and unmatched_trackers
+  """
+  if(len(trackers)==0):
+    return np.empty((0,2),dtype=int), np.arange(len(detections)), np.empty((0,5),dtype=int)
+
+  n_dets, n_trks = len(detections), len(trackers)
+  if n_dets * n_trks <= DENSE_IOU_LIMIT:
+    # small frames are cheaper to solve densely, on the gated matrix
+    if n_dets == 0:
+      return _gated_matches(np.empty((0, 2), dtype=int), n_dets, n_trks)
+    iou_matrix = iou_batch(detections, trackers)
+    iou_matrix[iou_matrix < iou_threshold] = 0.
+    m = linear_assignment(-iou_matrix)
+    return _gated_matches(m[iou_matrix[m[:, 0], m[:, 1]] > 0], n_dets, n_trks)
+
+  pairs, ious = iou_pairs(detections, trackers)
+  gate = ious >= iou_threshold
+  edges = pairs[gate]
+  edge_ious = ious[gate]
+
+  # pairs whose detection and tracker have no other candidate are matched
+  # directly
+  det_degree = np.bincount(edges[:, 0], minlength=n_dets)
+  trk_degree = np.bincount(edges[:, 1], minlength=n_trks)
+  simple = (det_degree[edges[:, 0]] == 1) & (trk_degree[edges[:, 1]] == 1)
+  matched = [edges[simple]]
+
+  # everything else is solved one connected component at a time
+  ambiguous = edges[~simple]
+  if len(ambiguous):
+    ambiguous_ious = edge_ious[~simple]
+    labels = _connected_components(ambiguous, n_dets, n_trks)
+    edge_labels = labels[ambiguous[:, 0]]
+    order = np.argsort(edge_labels, kind='stable')
+    _, starts = np.unique(edge_labels[order], return_index=True)
+    det_local = np.zeros(n_dets, dtype=int)
+    trk_local = np.zeros(n_trks, dtype=int)
+    for comp in np.split(order, starts[1:]):
+      e = ambiguous[comp]
+      d = np.unique(e[:, 0])
+      t = np.unique(e[:, 1])
+      det_local[d] = np.arange(len(d))
+      trk_local[t] = np.arange(len(t))
+      sub = np.zeros((len(d), len(t)))
+      sub[det_local[e[:, 0]], trk_local[e[:, 1]]] = ambiguous_ious[comp]
+      m = linear_assignment(-sub)
+      m = m[sub[m[:, 0], m[:, 1]] >= iou_threshold]
+      matched.append(np.stack((d[m[:, 0]], t[m[:, 1]]), axis=1))
+  return _gated_matches(np.concatenate(matched).reshape(-1, 2), n_dets, n_trks)
+
+
+def _gated_matches(matches, n_dets, n_trks):
+  """
+  Returns matches sorted by detection, and the unmatched detections and
+  trackers in index order, for either path of the gated association.
+  """
+  matches = matches[np.argsort(matches[:, 0], kind='stable')]
+  det_free = np.ones(n_dets, dtype=bool)
+  det_free[matches[:, 0]] = False
+  trk_free = np.ones(n_trks, dtype=bool)
+  trk_free[matches[:, 1]] = False
+  return matches, np.flatnonzero(det_free), np.flatnonzero(trk_free)
 
 
 class Sort(object):
-  def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3):
+  def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3, gated=False):
     """
-    Sets key parameters for SORT
+    Sets key parameters for SORT. gated selects the component-splitting
+    association fast path.
     """
     self.max_age = max_age
     self.min_hits = min_hits
     self.iou_threshold = iou_threshold
+    self.associate = associate_detections_to_trackers_gated if gated else associate_detections_to_trackers
     self.trackers = []
     self.frame_count = 0
+    self.last_match_iou = None
 
   def update(self, dets=np.empty((0, 5))):
     """
@@ -229,7 +401,9 @@ class Sort(object):
     trks = np.ma.compress_rows(np.ma.masked_invalid(trks))
     for t in reversed(to_del):
       self.trackers.pop(t)
-    matched, unmatched_dets, unmatched_trks = associate_detections_to_trackers(dets,trks, self.iou_threshold)
+    matched, unmatched_dets, unmatched_trks = self.associate(dets,trks, self.iou_threshold)
+
+    self.last_match_iou = paired_iou(dets[matched[:, 0]], trks[matched[:, 1]]).mean() if len(matched) else None
 
     # update matched trackers with assigned detections
     for m in matched:
@@ -252,79 +426,221 @@ class Sort(object):
       return np.concatenate(ret)
     return np.empty((0,5))
 
-def parse_args():
-    """Parse input arguments."""
-    parser = argparse.ArgumentParser(description='SORT demo')
-    parser.add_argument('--display', dest='display', help='Display online tracker output (slow) [False]',action='store_true')
-    parser.add_argument("--seq_path", help="Path to detections.", type=str, default='data')
-    parser.add_argument("--phase", help="Subdirectory in seq_path.", type=str, default='train')
-    parser.add_argument("--max_age", 
-                        help="Maximum number of frames to keep alive a track without associated detections.", 
-                        type=int, default=1)
-    parser.add_argument("--min_hits", 
-                        help="Minimum number of associated detections before track is initialised.", 
-                        type=int, default=3)
-    parser.add_argument("--iou_threshold", help="Minimum IOU for match.", type=float, default=0.3)
-    args = parser.parse_args()
-    return args
-
-if __name__ == '__main__':
-  # all train
-  args = parse_args()
-  display = args.display
-  phase = args.phase
-  total_time = 0.0
-  total_frames = 0
-  colours = np.random.rand(32, 3) #used only for display
-  if(display):
-    if not os.path.exists('mot_benchmark'):
-      print('\n\tERROR: mot_benchmark link not found!\n\n    Create a symbolic link to the MOT benchmark\n    (https://motchallenge.net/data/2D_MOT_2015/#download). E.g.:\n\n    $ ln -s /path/to/MOT2015_challenge/2DMOT2015 mot_benchmark\n\n')
-      exit()
-    plt.ion()
-    fig = plt.figure()
-    ax1 = fig.add_subplot(111, aspect='equal')
-
-  if not os.path.exists('output'):
-    os.makedirs('output')
-  pattern = os.path.join(args.seq_path, phase, '*', 'det', 'det.txt')
-  for seq_dets_fn in glob.glob(pattern):
-    mot_tracker = Sort(max_age=args.max_age, 
-                       min_hits=args.min_hits,
-                       iou_threshold=args.iou_threshold) #create instance of the SORT tracker
-    seq_dets = np.loadtxt(seq_dets_fn, delimiter=',')
-    seq = seq_dets_fn[pattern.find('*'):].split(os.path.sep)[0]
-    
-    with open(os.path.join('output', '%s.txt'%(seq)),'w') as out_file:
-      print("Processing %s."%(seq))
-      for frame in range(int(seq_dets[:,0].max())):
-        frame += 1 #detection and frame numbers begin at 1
-        dets = seq_dets[seq_dets[:, 0]==frame, 2:7]
-        dets[:, 2:4] += dets[:, 0:2] #convert to [x1,y1,w,h] to [x1,y1,x2,y2]
-        total_frames += 1
-
-        if(display):
-          fn = os.path.join('mot_benchmark', phase, seq, 'img1', '%06d.jpg'%(frame))
-          im =io.imread(fn)
-          ax1.imshow(im)
-          plt.title(seq + ' Tracked Targets')
-
-        start_time = time.time()
-        trackers = mot_tracker.update(dets)
-        cycle_time = time.time() - start_time
-        total_time += cycle_time
-
-        for d in trackers:
-          print('%d,%d,%.2f,%.2f,%.2f,%.2f,1,-1,-1,-1'%(frame,d[4],d[0],d[1],d[2]-d[0],d[3]-d[1]),file=out_file)
-          if(display):
-            d = d.astype(np.int32)
-            ax1.add_patch(patches.Rectangle((d[0],d[1]),d[2]-d[0],d[3]-d[1],fill=False,lw=3,ec=colours[d[4]%32,:]))
-
-        if(display):
-          fig.canvas.flush_events()
-          plt.draw()
-          ax1.cla()
-
-  print("Total Tracking took: %.3f seconds for %d frames or %.1f FPS" % (total_time, total_frames, total_frames / total_time))
-
-  if(display):
-    print("Note: to get real runtime results run without the option: --display")
+  def predict(self):
+    """
+    Coasts every track one frame on its motion model, for frames where the
+    detector was skipped. Hits and misses are left untouched, so skipped
+    frames neither confirm nor kill a track.
+    Returns the predicted boxes of the tracks update() would currently
+    report, in the same [x1,y1,x2,y2,id] format.
+    """
+    ret = []
+    for trk in reversed(self.trackers):
+      d = trk.coast()[0]
+      if np.any(np.isnan(d)):
+        continue
+      if (trk.time_since_update < 1) and (trk.hit_streak >= self.min_hits or self.frame_count <= self.min_hits):
+        ret.append(np.concatenate((d,[trk.id+1])).reshape(1,-1)) # +1 as MOT benchmark requires positive
+    if(len(ret)>0):
+      return np.concatenate(ret)
+    return np.empty((0,5))
+
+# Constant velocity model shared by every track of VectorizedSort. These are
+# the same matrices KalmanBoxTracker sets up on its filterpy KalmanFilter.
+_KF_F = np.array([[1,0,0,0,1,0,0],[0,1,0,0,0,1,0],[0,0,1,0,0,0,1],[0,0,0,1,0,0,0],  [0,0,0,0,1,0,0],[0,0,0,0,0,1,0],[0,0,0,0,0,0,1]], dtype=float)
+_KF_H = np.array([[1,0,0,0,0,0,0],[0,1,0,0,0,0,0],[0,0,1,0,0,0,0],[0,0,0,1,0,0,0]], dtype=float)
+_KF_R = np.eye(4)
+_KF_R[2:,2:] *= 10.
+_KF_P0 = np.eye(7)
+_KF_P0[4:,4:] *= 1000. #give high uncertainty to the unobservable initial velocities
+_KF_P0 *= 10.
+_KF_Q = np.eye(7)
+_KF_Q[-1,-1] *= 0.01
+_KF_Q[4:,4:] *= 0.01
+_KF_I = np.eye(7)
+
+
+def convert_bboxes_to_z(bboxes):
+  """
+  Vectorised convert_bbox_to_z: takes an (N,4+) array of [x1,y1,x2,y2] boxes
+    and returns an (N,4) array of [x,y,s,r]
+  """
+  w = bboxes[:, 2] - bboxes[:, 0]
+  h = bboxes[:, 3] - bboxes[:, 1]
+  x = bboxes[:, 0] + w/2.
+  y = bboxes[:, 1] + h/2.
+  s = w * h    #scale is just area
+  r = w / h.astype(float)
+  return np.stack((x, y, s, r), axis=1)
+
+
+def convert_xs_to_bbox(xs):
+  """
+  Vectorised convert_x_to_bbox: takes an (N,7+) array of states and returns
+    an (N,4) array of [x1,y1,x2,y2]
+  """
+  w = np.sqrt(xs[:, 2] * xs[:, 3])
+  h = xs[:, 2] / w
+  return np.stack((xs[:, 0]-w/2., xs[:, 1]-h/2., xs[:, 0]+w/2., xs[:, 1]+h/2.), axis=1)
+
+
+class VectorizedSort(object):
+  """
+  Array-backed SORT engine. Instead of one KalmanBoxTracker (and filterpy
+  KalmanFilter) per track, the states and covariances of all tracks live in
+  stacked (N,7) and (N,7,7) arrays and predict/update run as one batched
+  operation per frame.
+
+  It is a drop-in replacement for Sort: update() has the same contract, the
+  filter follows the same equations in the same order, and track IDs come
+  from the same KalmanBoxTracker.count sequence, so the output matches Sort
+  ID for ID.
+  """
+  def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3, gated=False):
+    """
+    Sets key parameters for SORT. gated selects the component-splitting
+    association fast path.
+    """
+    self.max_age = max_age
+    self.min_hits = min_hits
+    self.iou_threshold = iou_threshold
+    self.associate = associate_detections_to_trackers_gated if gated else associate_detections_to_trackers
+    self.frame_count = 0
+    self.last_match_iou = None
+    self.x = np.zeros((0, 7))
+    self.P = np.zeros((0, 7, 7))
+    self.ids = np.zeros(0, dtype=int)
+    self.time_since_update = np.zeros(0, dtype=int)
+    self.hits = np.zeros(0, dtype=int)
+    self.hit_streak = np.zeros(0, dtype=int)
+    self.age = np.zeros(0, dtype=int)
+
+  def __len__(self):
+    return len(self.ids)
+
+  def _keep(self, mask):
+    """
+    Drops the tracks where mask is False, preserving order.
+    """
+    self.x = self.x[mask]
+    self.P = self.P[mask]
+    self.ids = self.ids[mask]
+    self.time_since_update = self.time_since_update[mask]
+    self.hits = self.hits[mask]
+    self.hit_streak = self.hit_streak[mask]
+    self.age = self.age[mask]
+
+  def _advance(self):
+    """
+    Moves every track one step along its motion model.
+    """
+    stalled = (self.x[:, 6] + self.x[:, 2]) <= 0
+    self.x[stalled, 6] *= 0.0
+    self.x = np.matmul(_KF_F, self.x[:, :, None])[:, :, 0]
+    self.P = np.matmul(np.matmul(_KF_F, self.P), _KF_F.T) + _KF_Q
+    self.age += 1
+
+  def _predict(self):
+    """
+    Advances every track one step and returns the predicted boxes.
+    """
+    self._advance()
+    self.hit_streak[self.time_since_update > 0] = 0
+    self.time_since_update += 1
+    return convert_xs_to_bbox(self.x)
+
+  def _update(self, idx, bboxes):
+    """
+    Updates the tracks at positions idx with their observed boxes.
+    """
+    if len(idx) == 0:
+      return
+    x = self.x[idx][:, :, None]
+    P = self.P[idx]
+    z = convert_bboxes_to_z(bboxes)[:, :, None]
+    y = z - np.matmul(_KF_H, x)
+    PHT = np.matmul(P, _KF_H.T)
+    S = np.matmul(_KF_H, PHT) + _KF_R
+    K = np.matmul(PHT, np.linalg.inv(S))
+    x = x + np.matmul(K, y)
+    I_KH = _KF_I - np.matmul(K, _KF_H)
+    P = np.matmul(np.matmul(I_KH, P), I_KH.transpose(0, 2, 1)) + np.matmul(np.matmul(K, _KF_R), K.transpose(0, 2, 1))
+    self.x[idx] = x[:, :, 0]
+    self.P[idx] = P
+    self.time_since_update[idx] = 0
+    self.hits[idx] += 1
+    self.hit_streak[idx] += 1
+
+  def _create(self, bboxes):
+    """
+    Starts a new track for each box.
+    """
+    n = len(bboxes)
+    if n == 0:
+      return
+    x = np.zeros((n, 7))
+    x[:, :4] = convert_bboxes_to_z(bboxes)
+    ids = np.arange(KalmanBoxTracker.count, KalmanBoxTracker.count + n)
+    KalmanBoxTracker.count += n
+    self.x = np.concatenate((self.x, x))
+    self.P = np.concatenate((self.P, np.repeat(_KF_P0[None], n, axis=0)))
+    self.ids = np.concatenate((self.ids, ids))
+    zeros = np.zeros(n, dtype=int)
+    self.time_since_update = np.concatenate((self.time_since_update, zeros))
+    self.hits = np.concatenate((self.hits, zeros))
+    self.hit_streak = np.concatenate((self.hit_streak, zeros))
+    self.age = np.concatenate((self.age, zeros))
+
+  def update(self, dets=np.empty((0, 5))):
+    """
+    Params:
+      dets - a numpy array of detections in the format [[x1,y1,x2,y2,score],[x1,y1,x2,y2,score],...]
+    Requires: this method must be called once for each frame even with empty detections (use np.empty((0, 5)) for frames without detections).
+    Returns the a similar array, where the last column is the object ID.
+
+    NOTE: The number of objects returned may differ from the number of detections provided.
+    """
+    self.frame_count += 1
+    # get predicted locations from existing trackers.
+    pos = self._predict()
+    valid = ~np.any(np.isnan(pos), axis=1)
+    if not valid.all():
+      self._keep(valid)
+      pos = pos[valid]
+    trks = np.zeros((len(pos), 5))
+    trks[:, :4] = pos
+    matched, unmatched_dets, unmatched_trks = self.associate(dets,trks, self.iou_threshold)
+
+    # update matched trackers with assigned detections
+    matched = np.asarray(matched, dtype=int).reshape(-1, 2)
+    self.last_match_iou = paired_iou(dets[matched[:, 0]], trks[matched[:, 1]]).mean() if len(matched) else None
+    self._update(matched[:, 1], dets[matched[:, 0], :])
+
+    # create and initialise new trackers for unmatched detections
+    self._create(dets[np.asarray(unmatched_dets, dtype=int), :])
+
+    boxes = convert_xs_to_bbox(self.x)
+    alive = (self.time_since_update < 1) & ((self.hit_streak >= self.min_hits) | (self.frame_count <= self.min_hits))
+    ret = np.concatenate((boxes, (self.ids + 1)[:, None]), axis=1)[alive][::-1] # +1 as MOT benchmark requires positive
+    # remove dead tracklet
+    self._keep(self.time_since_update <= self.max_age)
+    if(len(ret)>0):
+      return ret
+    return np.empty((0,5))
+
+  def predict(self):
+    """
+    Coasts every track one frame on its motion model, for frames where the
+    detector was skipped. Hits and misses are left untouched, so skipped
+    frames neither confirm nor kill a track.
+    Returns the predicted boxes of the tracks update() would currently
+    report, in the same [x1,y1,x2,y2,id] format.
+    """
+    self._advance()
+    boxes = convert_xs_to_bbox(self.x)
+    alive = (self.time_since_update < 1) & ((self.hit_streak >= self.min_hits) | (self.frame_count <= self.min_hits))
+    alive &= ~np.any(np.isnan(boxes), axis=1)
+    ret = np.concatenate((boxes, (self.ids + 1)[:, None]), axis=1)[alive][::-1] # +1 as MOT benchmark requires positive
+    if(len(ret)>0):
+      return ret
+    return np.empty((0,5))